@@ -0,0 +1,125 @@
+"""In-memory alias index over the deduplicated email network.
+
+Maps every node ID and alias in email_network.json, plus the dedup match key
+of each (structural cleanup + domain normalization + local-part OCR
+normalization, i.e. dedup Layers 1-3), to its canonical node. Any raw or
+OCR-garbled address that shares a match key with a known alias resolves to
+that node with two dict lookups. The index reloads when the file changes; if
+the new file cannot be parsed (e.g. it is still being written), the old maps
+keep serving until a later version loads.
+"""
+
+import os
+import sys
+import threading
+import time
+
+from dedup_network import (
+    NETWORK_READ_ERRORS,
+    apply_domain_normalization,
+    apply_local_ocr_normalization,
+    iter_network_items,
+    structural_cleanup,
+)
+
+
+def match_key(address):
+    """Key shared by OCR variants of an address (dedup Layers 1-3)."""
+    key = structural_cleanup(address)
+    key = apply_domain_normalization(key)
+    return apply_local_ocr_normalization(key)
+
+
+class AliasIndex:
+    """Hash index from raw/garbled addresses to canonical network nodes."""
+
+    def __init__(self, path, check_interval=5.0, log=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.log = log or (lambda msg: print(msg, file=sys.stderr, flush=True))
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._exact = {}    # lowercased id/alias -> node id
+        self._keys = {}     # match key -> node id
+        self._nodes = {}    # node id -> resolved record
+        self._mtime = None
+        self._failed_mtime = None  # version that last failed to load
+        self._last_check = 0.0
+
+    def load(self):
+        """(Re)build the index from the network file. Returns the node count."""
+        mtime = os.path.getmtime(self.path)
+        exact, keys, nodes = {}, {}, {}
+        key_counts = {}
+        for node in iter_network_items(self.path, "nodes"):
+            node_id = node["id"]
+            count = node.get("count", 0)
+            aliases = sorted(set(node.get("aliases") or []) | {node_id})
+            nodes[node_id] = {
+                "id": node_id,
+                "name": node.get("name", ""),
+                "count": count,
+                "doc_freq": node.get("doc_freq"),
+                "aliases": aliases,
+            }
+            for address in aliases:
+                exact[address.lower()] = node_id
+                key = match_key(address)
+                # Two nodes can share a match key when later dedup layers kept
+                # them apart; resolve garbled input to the busier one.
+                if key not in keys or count > key_counts[key]:
+                    keys[key] = node_id
+                    key_counts[key] = count
+        with self._lock:
+            self._exact, self._keys, self._nodes = exact, keys, nodes
+            self._mtime = mtime
+            self._last_check = time.monotonic()
+        return len(nodes)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        # Only one request thread rebuilds; the rest keep using the old maps.
+        if mtime in (self._mtime, self._failed_mtime):
+            return
+        if self._reload_lock.acquire(blocking=False):
+            try:
+                self.load()
+            except NETWORK_READ_ERRORS as e:
+                self._failed_mtime = mtime
+                self.log(f"Alias index reload from {self.path} failed, keeping old index: {e}")
+            finally:
+                self._reload_lock.release()
+
+    @property
+    def version(self):
+        """Changes whenever the index is reloaded from a modified file."""
+        return self._mtime
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def resolve(self, address):
+        """Resolve an address to its canonical node record, or None.
+
+        The record holds id, name, count, doc_freq and the full alias list,
+        plus "matched": "exact" or "normalized".
+        """
+        if not address:
+            return None
+        self._maybe_reload()
+        exact, keys, nodes = self._exact, self._keys, self._nodes
+        node_id = exact.get(address.strip().lower())
+        matched = "exact"
+        if node_id is None:
+            node_id = keys.get(match_key(address))
+            matched = "normalized"
+        if node_id is None:
+            return None
+        return dict(nodes[node_id], matched=matched)
@@ -0,0 +1,161 @@
+"""Regexes matching an address, or a set of alias addresses, in document text.
+
+Shared by app.py and fetch_correspondence.py. Each alias matches as
+`local@[a-zA-Z0-9._-]*base`, where base is the last two domain labels. The
+`[...]*` lets it absorb subdomains and OCR noise, e.g. bennett.tate@epa.gov
+matches bennett.tate@epamail.epa.gov. The patterns are unanchored and
+queried case-insensitively.
+
+For alias sets, build_aliases_regex does not emit a flat alternation with
+one branch per alias. It:
+
+  * lowercases and drops aliases that another alias already matches. The
+    pattern is unanchored on the left, so `smith@...epa.gov` also matches
+    every `jsmith@...epa.gov`. A base that contains a shorter one is
+    covered the same way.
+  * groups the remaining locals by the set of bases they occur with, so
+    each shared `@[a-zA-Z0-9._-]*(?:bases)` tail is written once.
+  * factors each group's locals (and its bases) into a prefix trie,
+    e.g. `lee(?:\\.(?:james|linda)|-linda)`. The regex engine then tries
+    one branch per distinct character instead of every alias at every
+    position.
+
+The factored regex matches exactly the texts the flat alternation does.
+"""
+
+import re
+from collections import defaultdict
+
+DOMAIN_TAIL = "@[a-zA-Z0-9._-]*"
+_DOMAIN_CHARS = re.compile(r"[a-zA-Z0-9._-]*")
+
+
+def _split(email):
+    """(local, base domain) of an address."""
+    local, domain = email.split("@", 1)
+    domain_parts = domain.split(".")
+    if len(domain_parts) >= 2:
+        base = ".".join(domain_parts[-2:])
+    else:
+        base = domain
+    return local, base
+
+
+def build_email_regex(email):
+    """Build a regex that matches this email with OCR domain variants.
+
+    For example, bennett.tate@epa.gov matches:
+      bennett.tate@epa.gov
+      bennett.tate@epa.govl
+      bennett.tate@epamail.epa.gov
+    """
+    local, base = _split(email)
+    return f"{re.escape(local)}{DOMAIN_TAIL}{re.escape(base)}"
+
+
+def build_flat_aliases_regex(aliases):
+    """One alternation branch per alias (the original form, kept for comparison)."""
+    patterns = [build_email_regex(a) for a in aliases if "@" in a]
+    if not patterns:
+        return None
+    if len(patterns) == 1:
+        return patterns[0]
+    return "(?:" + "|".join(patterns) + ")"
+
+
+def _base_covers(short, long):
+    """Whether `@[...]*short` matches wherever `@[...]*long` does."""
+    i = long.find(short)
+    return i >= 0 and _DOMAIN_CHARS.fullmatch(long[:i]) is not None
+
+
+def _covers(a, b):
+    """Whether alias pattern a matches every text alias pattern b matches."""
+    return b[0].endswith(a[0]) and _base_covers(a[1], b[1])
+
+
+def reduce_aliases(aliases):
+    """Lowercased (local, base) pairs, minus those subsumed by another alias."""
+    pairs = sorted({tuple(p.lower() for p in _split(a)) for a in aliases if "@" in a},
+                   key=lambda p: (len(p[0]) + len(p[1]), p))
+    kept = []
+    # Shortest first: an alias can only be covered by one no longer than itself
+    for pair in pairs:
+        if not any(_covers(k, pair) for k in kept):
+            kept.append(pair)
+    return kept
+
+
+def trie_regex(words):
+    """Regex alternation of words, factored on common prefixes."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def render(node):
+        end = "" in node
+        branches = [re.escape(ch) + render(node[ch]) for ch in sorted(node) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not end:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if end else body
+
+    return render(trie)
+
+
+def _is_group(pattern):
+    """Whether pattern is one (?:...) group spanning the whole string."""
+    if not pattern.startswith("(?:") or not pattern.endswith(")"):
+        return False
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            if depth == 0:
+                return i == len(pattern) - 1
+        i += 1
+    return False
+
+
+def _group(pattern):
+    """Wrap a rendered trie so it can be followed by more pattern."""
+    if re.fullmatch(r"(?:[^|()\\]|\\.)*", pattern) or _is_group(pattern):
+        return pattern
+    return f"(?:{pattern})"
+
+
+def build_aliases_regex(aliases):
+    """Build a single regex that matches any of the email aliases."""
+    pairs = reduce_aliases(aliases)
+    if not pairs:
+        return None
+    if len(pairs) == 1:
+        local, base = pairs[0]
+        return f"{re.escape(local)}{DOMAIN_TAIL}{re.escape(base)}"
+
+    bases_by_local = defaultdict(set)
+    for local, base in pairs:
+        bases_by_local[local].add(base)
+    locals_by_bases = defaultdict(list)
+    for local, bases in bases_by_local.items():
+        locals_by_bases[frozenset(bases)].append(local)
+
+    branches = sorted(
+        f"{_group(trie_regex(locals_))}{DOMAIN_TAIL}{_group(trie_regex(bases))}"
+        for bases, locals_ in locals_by_bases.items()
+    )
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
@@ -1,53 +1,481 @@
 #!/usr/bin/env python3.9
 """Flask server for Email Explorer - replaces server.js on EC2."""
 import os
-import re
 import json
+import base64
+import bisect
 import time
 import tempfile
+import hashlib
+import threading
+import uuid
 import zipfile
-import urllib.request
-import urllib.error
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, g, request, jsonify, send_from_directory
 import boto3
+import urllib3
+from bson import json_util
 from botocore.exceptions import ClientError
 from pymongo import MongoClient
 
+from alias_index import AliasIndex
+from dedup_network import NETWORK_READ_ERRORS
+import metrics
+from alias_regex import build_aliases_regex, build_email_regex
+from extract_emails import EMAILS_FIELD, email_query_keys
+from pair_index import PAIR_COLLECTION, lookup_pair
+from pdf_cache import PdfCache
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
 app = Flask(__name__, static_folder="public", static_url_path="")
 
-DOWNLOAD_DELAY = 0.05
+DOWNLOAD_DELAY = 0.05  # pause the old sequential download loop took after each PDF
+# CDN politeness, per process. The old loop, one request at a time plus
+# DOWNLOAD_DELAY, managed about 3 requests/s at typical PDF latencies.
+CDN_RATE_LIMIT = float(os.environ.get("CDN_RATE_LIMIT", "3"))  # requests per second
+CDN_MAX_CONNECTIONS = int(os.environ.get("CDN_MAX_CONNECTIONS", "2"))  # concurrent requests
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_WINDOW = DOWNLOAD_WORKERS * 2  # PDFs in flight or awaiting the zip writer, per build
+DOWNLOAD_RETRIES = 3
+RETRY_BACKOFF = 0.5
+JOB_WORKERS = 4
+JOB_TTL = 3600  # seconds a finished job's status stays available
+# Directory for per-zip lock files; set it to single-flight builds across processes
+BUILD_LOCK_DIR = os.environ.get("BUILD_LOCK_DIR")
+S3_PART_SIZE = 8 * 1024 * 1024  # S3 minimum is 5 MB for all but the last part
+ZIP_SPOOL_BYTES = 64 * 1024 * 1024  # cached zips larger than this spill to disk while appending
 S3_BUCKET = "edgizips"
 S3_PREFIX = "correspondence"
 PRESIGN_EXPIRY = 3600
-MAX_DOCS = 500
+FAILED_RETRY_AFTER = 24 * 3600  # seconds before a PDF that failed to download is tried again
+MAX_DOCS = 500  # documents per page, and so per zip part
 CDN_BASE = "https://cdn.toxicdocs.org"
+USER_AGENT = "EmailExplorer/1.0"
+HTTP_POOL_SIZE = 10
 
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB = os.environ.get("MONGO_DB", "test")
 MONGO_COLLECTION = os.environ.get("MONGO_COLLECTION", "edgifoia")
+MONGO_POOL_SIZE = 50
+INDEX_CHECK_INTERVAL = 300
+CANDIDATE_LIMIT = 20000  # max rarer-side matches to intersect by _id
+MAX_GROUP_SIZE = 10
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL = 600
+ZIP_CACHE_TTL = 300  # well under PRESIGN_EXPIRY, so a cached URL has most of its life left
+WATERMARK_CHECK_INTERVAL = 60
 
+NETWORK_PATH = os.environ.get(
+    "NETWORK_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "public", "email_network.json"))
+ALIAS_RELOAD_INTERVAL = 5.0
 
-def build_email_regex(email):
-    local, domain = email.split("@", 1)
-    local_escaped = re.escape(local)
-    domain_parts = domain.split(".")
-    if len(domain_parts) >= 2:
-        base = ".".join(domain_parts[-2:])
-    else:
-        base = domain
-    base_escaped = re.escape(base)
-    return f"{local_escaped}@[a-zA-Z0-9._-]*{base_escaped}"
+ALIAS_INDEX = AliasIndex(NETWORK_PATH, check_interval=ALIAS_RELOAD_INTERVAL,
+                         log=app.logger.warning)
+try:
+    app.logger.info(f"Alias index: {ALIAS_INDEX.load()} nodes from {NETWORK_PATH}")
+except NETWORK_READ_ERRORS as e:
+    # Start anyway; the index picks the file up once it appears.
+    app.logger.warning(f"Alias index not loaded from {NETWORK_PATH}: {e}")
 
 
-def build_aliases_regex(aliases):
-    """Build a single regex that matches any of the email aliases."""
-    patterns = [build_email_regex(a) for a in aliases if '@' in a]
-    if not patterns:
-        return None
-    if len(patterns) == 1:
-        return patterns[0]
-    return '(?:' + '|'.join(patterns) + ')'
+# Served on /metrics. Stages: regex_build, mongo_query, pair_index, s3_head,
+# s3_manifest, cdn_download (each request), zip_write (each PDF, including
+# any multipart upload it triggers), s3_download and s3_upload.
+STAGE_SECONDS = metrics.Histogram(
+    "emailexplorer_stage_seconds", "Seconds spent in each stage of a correspondence build",
+    ["stage"])
+REQUEST_SECONDS = metrics.Histogram(
+    "emailexplorer_request_seconds", "API request latency", ["endpoint", "status"])
+CDN_BYTES = metrics.Counter("emailexplorer_cdn_bytes_total", "PDF bytes downloaded from the CDN")
+CDN_FAILURES = metrics.Counter(
+    "emailexplorer_cdn_failures_total", "Failed CDN requests, including retried ones", ["reason"])
+S3_UPLOAD_BYTES = metrics.Counter("emailexplorer_s3_upload_bytes_total", "Zip bytes uploaded to S3")
+JOBS_FINISHED = metrics.Counter("emailexplorer_jobs_total", "Finished zip jobs", ["state"])
+PDFS_ZIPPED = metrics.Counter("emailexplorer_pdfs_total", "PDFs added to zips, or failed", ["result"])
+
+
+# Process-wide clients, created on first use and reused by every request.
+# Keyed by pid so a worker forked after first use builds its own
+# (MongoClient and urllib3 pools are not fork-safe).
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(name, factory):
+    key = (name, os.getpid())
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = factory()
+    return client
+
+
+def get_db():
+    client = _get_client("mongo", lambda: MongoClient(MONGO_URI, maxPoolSize=MONGO_POOL_SIZE))
+    return client[MONGO_DB]
+
+
+def get_collection():
+    return get_db()[MONGO_COLLECTION]
+
+
+def get_pair_collection():
+    return get_db()[PAIR_COLLECTION]
+
+
+_emails_index = {"checked": float("-inf"), "present": False}
+
+
+def has_emails_index(coll):
+    """Whether the documents carry an indexed `emails` field (re-checked periodically)."""
+    now = time.monotonic()
+    if now - _emails_index["checked"] > INDEX_CHECK_INTERVAL:
+        indexes = coll.index_information()
+        _emails_index["present"] = any(
+            spec["key"][0][0] == EMAILS_FIELD for spec in indexes.values())
+        _emails_index["checked"] = now
+    return _emails_index["present"]
+
+
+def get_s3():
+    return _get_client("s3", lambda: boto3.client("s3"))
+
+
+def get_http():
+    """Keep-alive connection pool for the CDN."""
+    return _get_client("http", lambda: urllib3.PoolManager(
+        maxsize=HTTP_POOL_SIZE, headers={"User-Agent": USER_AGENT},
+        timeout=urllib3.Timeout(connect=10, read=30), retries=False))
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` acquisitions per second."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedRateLimit:
+    """Rate limit shared by every process that uses the same file.
+
+    The file holds the wall-clock time of the next free request slot. Each
+    acquire claims a slot under an exclusive flock, then sleeps until it.
+    """
+
+    def __init__(self, path, rate):
+        self.path = path
+        self.interval = 1 / rate
+
+    def acquire(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                next_slot = float(os.pread(fd, 64, 0) or 0)
+            except ValueError:
+                next_slot = 0.0
+            now = time.time()
+            slot = max(now, next_slot)
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, repr(slot + self.interval).encode(), 0)
+        finally:
+            os.close(fd)  # releases the flock
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class RateLimits:
+    """Acquires from each of several limits in turn."""
+
+    def __init__(self, *limits):
+        self.limits = limits
+
+    def acquire(self):
+        for limit in self.limits:
+            limit.acquire()
+
+
+# Shared by every request in the process, so concurrent zip builds together
+# stay within CDN_RATE_LIMIT and CDN_MAX_CONNECTIONS. With BUILD_LOCK_DIR the
+# rate is shared with the other processes too (app workers, prewarm.py).
+if BUILD_LOCK_DIR and HAS_FCNTL:
+    os.makedirs(BUILD_LOCK_DIR, exist_ok=True)
+    CDN_RATE = SharedRateLimit(os.path.join(BUILD_LOCK_DIR, "cdn-rate"), CDN_RATE_LIMIT)
+else:
+    CDN_RATE = TokenBucket(CDN_RATE_LIMIT)
+CDN_CONNECTIONS = threading.BoundedSemaphore(CDN_MAX_CONNECTIONS)
+
+
+def download_pdf(hash_id):
+    """Download one PDF, retrying connection errors, 429 and 5xx with backoff."""
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            with CDN_CONNECTIONS:
+                CDN_RATE.acquire()
+                with STAGE_SECONDS.time(stage="cdn_download"):
+                    resp = get_http().request("GET", build_pdf_url(hash_id))
+        except urllib3.exceptions.HTTPError as e:
+            CDN_FAILURES.inc(reason="connection")
+            last_error = e
+        else:
+            if resp.status == 200:
+                CDN_BYTES.inc(len(resp.data))
+                return resp.data
+            CDN_FAILURES.inc(reason=f"http_{resp.status}")
+            last_error = IOError(f"HTTP {resp.status}")
+            if resp.status < 500 and resp.status != 429:
+                raise last_error
+        if attempt < DOWNLOAD_RETRIES:
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
+    raise last_error
+
+
+PDF_CACHE = PdfCache(log=app.logger.warning)
+
+
+def fetch_pdf(hash_id):
+    """PDF bytes from the local cache, going to the CDN only on a miss."""
+    return PDF_CACHE.fetch(hash_id, download_pdf)
+
+
+def fetch_prefetched_pdf(hash_id):
+    """A PDF fetch_pdf has just returned, re-read without counting a second cache lookup."""
+    data = PDF_CACHE.get(hash_id, count=False)
+    return data if data is not None else fetch_pdf(hash_id)
+
+
+class S3MultipartWriter:
+    """Write-only, non-seekable file object that streams into an S3 multipart upload.
+
+    Buffers writes and uploads a part each time S3_PART_SIZE bytes have
+    accumulated. tell() reports bytes written so far, which is all zipfile
+    needs to stream an archive (it falls back to data descriptors when it
+    cannot seek). close() uploads the tail and completes the upload; abort()
+    discards it.
+    """
+
+    def __init__(self, s3, bucket, key, part_size=S3_PART_SIZE):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self._buffer = bytearray()
+        self._parts = []
+        self._position = 0
+        self.bytes_uploaded = 0
+        self._upload_id = None
+        self.closed = False
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        if len(self._buffer) >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _upload_part(self):
+        if self._upload_id is None:
+            self._upload_id = self.s3.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType="application/zip")["UploadId"]
+        number = len(self._parts) + 1
+        with STAGE_SECONDS.time(stage="s3_upload"):
+            resp = self.s3.upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                PartNumber=number, Body=bytes(self._buffer))
+        self._parts.append({"PartNumber": number, "ETag": resp["ETag"]})
+        self.bytes_uploaded += len(self._buffer)
+        S3_UPLOAD_BYTES.inc(len(self._buffer))
+        self._buffer.clear()
+
+    def close(self):
+        if self.closed:
+            return
+        # The final part may be under the minimum size (or the only part)
+        if self._buffer or not self._parts:
+            self._upload_part()
+        with STAGE_SECONDS.time(stage="s3_upload"):
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts})
+        self.closed = True
+
+    def abort(self):
+        if self._upload_id is not None and not self.closed:
+            self.s3.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+        self.closed = True
+
+
+# Stream filters whose data gains nothing from being deflated again
+_COMPRESSED_PDF_FILTERS = (b"/FlateDecode", b"/DCTDecode", b"/JPXDecode",
+                           b"/JBIG2Decode", b"/CCITTFaxDecode")
+PDF_SNIFF_BYTES = 64 * 1024
+
+
+def pdf_compress_type(data):
+    """ZIP_STORED for PDFs whose streams are already compressed, else ZIP_DEFLATED."""
+    head = data[:PDF_SNIFF_BYTES]
+    if any(f in head for f in _COMPRESSED_PDF_FILTERS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def iter_pdfs(hash_ids, fetch=fetch_pdf):
+    """Download PDFs concurrently, yielding (hash_id, data) as each completes.
+
+    data is None for PDFs that failed after retries. At most DOWNLOAD_WINDOW
+    downloads are queued or held at once, so memory stays bounded however
+    many PDFs a zip gets.
+    """
+    remaining = iter(hash_ids)
+    pending = {}
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        def submit_next():
+            for hid in remaining:
+                pending[pool.submit(fetch, hid)] = hid
+                return
+
+        for _ in range(DOWNLOAD_WINDOW):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                hid = pending.pop(future)
+                submit_next()
+                try:
+                    data = future.result()
+                except Exception as e:
+                    app.logger.warning(f"Failed {hid}: {e}")
+                    data = None
+                yield hid, data
+
+
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _log_latency(response):
+    start = g.get("request_start")
+    if start is not None and request.path.startswith("/api/"):
+        elapsed = time.perf_counter() - start
+        # The route pattern, so job IDs don't each get their own series
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=str(response.status_code))
+        elapsed_ms = elapsed * 1000
+        app.logger.info(f"{request.method} {request.path} {response.status_code} "
+                        f"{elapsed_ms:.1f}ms")
+    return response
+
+
+def resolve_address(email, aliases=None):
+    """Return (canonical id, full alias list) for an address.
+
+    The alias list is merged with any client-sent aliases. Falls back to the
+    address itself and the client aliases when it is not in the network.
+    """
+    resolved = ALIAS_INDEX.resolve(email)
+    merged = set(aliases or [email])
+    if resolved:
+        merged.update(resolved["aliases"])
+        return resolved["id"], sorted(merged)
+    return email, sorted(merged)
+
+
+def address_doc_freq(email):
+    """Documents naming this address (from the network's doc_freq), or None if unknown."""
+    resolved = ALIAS_INDEX.resolve(email)
+    return resolved.get("doc_freq") if resolved else None
+
+
+def _side_clause(coll, email, aliases):
+    """Query clause matching documents that mention one side of the pair."""
+    if has_emails_index(coll):
+        # Indexed lookup on canonical header addresses
+        return {EMAILS_FIELD: {"$in": email_query_keys(aliases)}}
+    # Use aliases if provided (to match OCR variants in document text)
+    with STAGE_SECONDS.time(stage="regex_build"):
+        if aliases and len(aliases) > 1:
+            regex = build_aliases_regex(aliases)
+        else:
+            regex = build_email_regex(email)
+    return {"text": {"$regex": regex, "$options": "i"}}
+
+
+def query_documents(email1, email2, aliases1, aliases2, after=None):
+    """Scan the documents for both alias sets, in _id order from after.
+
+    Returns (hash_ids, last _id) for up to MAX_DOCS documents; the last _id
+    is None when nothing follows. When both addresses have a known
+    doc_freq, the rarer side is resolved first and the common side is only
+    checked on those candidates by _id.
+    """
+    coll = get_collection()
+    clause1 = _side_clause(coll, email1, aliases1)
+    clause2 = _side_clause(coll, email2, aliases2)
+    freq1, freq2 = address_doc_freq(email1), address_doc_freq(email2)
+    resume = [{"_id": {"$gt": after}}] if after is not None else []
+
+    query = {"$and": resume + [clause1, clause2]}
+    if freq1 is not None and freq2 is not None:
+        rare, common = (clause1, clause2) if freq1 <= freq2 else (clause2, clause1)
+        with STAGE_SECONDS.time(stage="mongo_query"):
+            candidates = [doc["_id"] for doc in
+                          coll.find({"$and": resume + [rare]}, {"_id": 1})
+                          .sort("_id", 1).limit(CANDIDATE_LIMIT + 1)]
+        if not candidates:
+            return [], None
+        # A rare side that turns out not to be rare gains nothing from the _id lookup
+        if len(candidates) <= CANDIDATE_LIMIT:
+            app.logger.info(f"  {len(candidates)} candidates from the rarer side "
+                            f"(doc_freq {min(freq1, freq2)} vs {max(freq1, freq2)})")
+            query = {"$and": [{"_id": {"$in": candidates}}, common]}
+
+    # One extra document tells whether another page follows
+    with STAGE_SECONDS.time(stage="mongo_query"):
+        docs = list(coll.find(query, {"hash_id": 1}).sort("_id", 1).limit(MAX_DOCS + 1))
+    last = docs[MAX_DOCS - 1]["_id"] if len(docs) > MAX_DOCS else None
+    return [str(doc["hash_id"]) for doc in docs[:MAX_DOCS] if doc.get("hash_id")], last
 
 
 def build_pdf_url(hash_id):
@@ -59,88 +487,762 @@ def index():
     return send_from_directory("public", "index.html")
 
 
+@app.route("/api/resolve-alias", methods=["GET", "POST"])
+def resolve_alias():
+    if request.method == "POST":
+        email = (request.get_json(silent=True) or {}).get("email", "")
+    else:
+        email = request.args.get("email", "")
+    if not email:
+        return jsonify(success=False, error="email is required"), 400
+    resolved = ALIAS_INDEX.resolve(email)
+    if resolved is None:
+        return jsonify(success=False, error="address not found"), 404
+    return jsonify(success=True, **resolved)
+
+
+class Job:
+    """Progress and result of one background zip build."""
+
+    def __init__(self, email1, email2, part=1):
+        self.id = uuid.uuid4().hex
+        self.email1 = email1
+        self.email2 = email2
+        self.part = part
+        self.s3_key = zip_key(email1, email2, part)
+        self.done = threading.Event()
+        self.state = "queued"  # queued -> running -> done | error
+        self.phase = None
+        self.doc_count = 0
+        self.downloaded = 0
+        self.failed = 0
+        self.bytes_uploaded = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "part": self.part,
+            "state": self.state,
+            "phase": self.phase,
+            "doc_count": self.doc_count,
+            "downloaded": self.downloaded,
+            "failed": self.failed,
+            "bytes_uploaded": self.bytes_uploaded,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class GroupJob(Job):
+    """A zip build for the documents shared by a whole group of addresses."""
+
+    def __init__(self, emails):
+        super().__init__(emails[0], emails[1])
+        self.emails = emails
+        self.s3_key = group_zip_key(emails)
+
+
+def zip_key(email1, email2, part=1):
+    """S3 key of one part of a pair's zip; part 1 keeps the unnumbered name."""
+    pair = '___'.join(sorted([email1, email2]))
+    if part == 1:
+        return f"{S3_PREFIX}/{pair}.zip"
+    return f"{S3_PREFIX}/{pair}.part{part}.zip"
+
+
+def group_zip_key(emails):
+    return f"{S3_PREFIX}/group/{'___'.join(sorted(emails))}.zip"
+
+
+# Pages of a pair's documents are addressed by an opaque cursor naming the
+# part it starts and the last document of the page before: a Mongo _id on
+# the scan path, a hash_id on the pair index path (its doc_ids are sorted).
+def encode_cursor(part, source, after):
+    state = json_util.dumps({"part": part, "source": source, "after": after})
+    return base64.urlsafe_b64encode(state.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """{"part", "source", "after"} from a cursor; page 1 for None. Raises ValueError."""
+    if cursor is not None and not isinstance(cursor, str):
+        raise ValueError(f"invalid cursor: {cursor!r}")
+    if not cursor:
+        return {"part": 1, "source": None, "after": None}
+    try:
+        state = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not (isinstance(state["part"], int) and state["part"] > 1
+                and state["source"] in ("pairs", "scan")):
+            raise ValueError
+        return state
+    except (ValueError, KeyError, TypeError):
+        raise ValueError(f"invalid cursor: {cursor}")
+
+
+# Jobs live in this process; run the app as one (threaded) process, or
+# route status polls back to the worker that accepted the job.
+JOBS = {}
+_inflight = {}  # S3 key -> queued or running Job
+_jobs_lock = threading.Lock()
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="zip-job")
+
+
+def _prune_jobs():
+    cutoff = time.time() - JOB_TTL
+    with _jobs_lock:
+        for job_id in [j.id for j in JOBS.values() if j.finished and j.finished < cutoff]:
+            del JOBS[job_id]
+
+
+def _run_job(job, build, *args):
+    job.state = "running"
+    try:
+        job.result = build(job, *args)
+        job.state = "done"
+    except Exception as e:
+        app.logger.exception(f"Job {job.id} failed")
+        job.error = str(e)
+        job.state = "error"
+    JOBS_FINISHED.inc(state=job.state)
+    job.finished = time.time()
+    with _jobs_lock:
+        _inflight.pop(job.s3_key, None)
+    job.done.set()
+
+
+def _enqueue(make_job, build, *args):
+    """Queue build(job, *args), or join the job already in flight for the same S3 key."""
+    _prune_jobs()
+    job = make_job()
+    with _jobs_lock:
+        inflight = _inflight.get(job.s3_key)
+        if inflight is not None:
+            app.logger.info(f"Joining in-flight job {inflight.id} for {job.s3_key}")
+            return inflight
+        JOBS[job.id] = job
+        _inflight[job.s3_key] = job
+    JOB_EXECUTOR.submit(_run_job, job, build, *args)
+    return job
+
+
+def submit_job(email1, email2, aliases1, aliases2, cursor=None):
+    """Queue a pair's zip build for the page at cursor."""
+    part = decode_cursor(cursor)["part"]
+    return _enqueue(lambda: Job(email1, email2, part), build_correspondence,
+                    email1, email2, aliases1, aliases2, cursor)
+
+
+def submit_group_job(emails, aliases):
+    """Queue a group's zip build."""
+    return _enqueue(lambda: GroupJob(emails), build_group, emails, aliases)
+
+
+@contextmanager
+def build_lock(s3_key):
+    """Cross-process exclusive lock on one zip's build (no-op without BUILD_LOCK_DIR)."""
+    if not BUILD_LOCK_DIR or not HAS_FCNTL:
+        yield
+        return
+    os.makedirs(BUILD_LOCK_DIR, exist_ok=True)
+    lock_path = os.path.join(BUILD_LOCK_DIR, hashlib.sha1(s3_key.encode()).hexdigest() + ".lock")
+    with open(lock_path, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class TTLCache:
+    """Thread-safe LRU map of at most maxsize entries, each expiring after ttl seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires, value), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._data.pop(key, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Matched hash_ids per pair of alias regexes, and per S3 key the zip's
+# manifest and a presigned URL. Repeat clicks skip the Mongo scan and the
+# S3 round trips. Both are dropped when the network file or the newest
+# ingested document changes.
+DOC_CACHE = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+ZIP_CACHE = TTLCache(RESULT_CACHE_SIZE, ZIP_CACHE_TTL)
+_cache_generation = {"checked": 0.0, "value": None}
+
+
+def _cache_counts():
+    counts = {}
+    for name, cache in (("documents", DOC_CACHE), ("zip", ZIP_CACHE), ("pdf", PDF_CACHE)):
+        counts[(name, "hit")] = cache.hits
+        counts[(name, "miss")] = cache.misses
+    return counts
+
+
+metrics.CallbackCounter("emailexplorer_cache_requests_total", "Cache lookups by cache and result",
+                        ["cache", "result"], _cache_counts)
+_cache_generation_lock = threading.Lock()
+
+
+def ingest_watermark():
+    """_id of the newest document in the collection, or None when it is empty."""
+    doc = get_collection().find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return doc["_id"] if doc else None
+
+
+def check_cache_generation():
+    """Clear the result caches if the alias index or ingest watermark moved."""
+    now = time.monotonic()
+    with _cache_generation_lock:
+        watermark_due = now - _cache_generation["checked"] > WATERMARK_CHECK_INTERVAL
+        current = _cache_generation["value"]
+        if watermark_due:
+            _cache_generation["checked"] = now
+            watermark = ingest_watermark()
+        else:
+            watermark = current[1] if current else None
+        generation = (ALIAS_INDEX.version, watermark)
+        if generation != current:
+            if current is not None:
+                app.logger.info("Network or ingest watermark changed; clearing result caches")
+            DOC_CACHE.clear()
+            ZIP_CACHE.clear()
+            _cache_generation["value"] = generation
+
+
+def _side_cache_key(email, aliases):
+    """What one side is queried with: its `emails` keys, or its normalized alias regex.
+
+    The regex drops aliases another alias already matches, but the indexed
+    lookup is exact, so it is keyed on every address it asks for.
+    """
+    if has_emails_index(get_collection()):
+        return ("emails", tuple(email_query_keys(aliases)))
+    if aliases and len(aliases) > 1:
+        return ("regex", build_aliases_regex(aliases))
+    return ("regex", build_email_regex(email).lower())
+
+
+def _pair_cache_key(email1, aliases1, email2, aliases2):
+    return tuple(sorted([_side_cache_key(email1, aliases1), _side_cache_key(email2, aliases2)]))
+
+
+def cache_zip(s3_key, manifest, url):
+    ZIP_CACHE.put(s3_key, {"manifest": manifest, "url": url})
+
+
+def cached_zip(s3_key, hash_ids):
+    """Response for a zip known to hold hash_ids, or None to go to S3."""
+    entry = ZIP_CACHE.get(s3_key)
+    if entry is None:
+        return None
+    manifest = entry["manifest"]
+    if manifest is None:
+        # Legacy zip without a manifest: served as it is
+        return {"success": True, "doc_count": len(hash_ids),
+                "download_url": entry["url"], "cached": True}
+    if missing_documents(manifest, hash_ids) or stale_documents(manifest, hash_ids):
+        return None
+    return {"success": True, "doc_count": len(manifest["hash_ids"]),
+            "download_url": entry["url"], "cached": True}
+
+
+def cached_correspondence(email1, email2, aliases1, aliases2, cursor=None):
+    """The zip response if both the page's documents and its zip are cached, else None."""
+    _, aliases1 = resolve_address(email1, aliases1)
+    _, aliases2 = resolve_address(email2, aliases2)
+    check_cache_generation()
+    page = DOC_CACHE.get((_pair_cache_key(email1, aliases1, email2, aliases2), cursor))
+    if not page or not page[0]:
+        return None
+    hash_ids, next_cursor = page
+    part = decode_cursor(cursor)["part"]
+    result = cached_zip(zip_key(email1, email2, part), hash_ids)
+    if result is None:
+        return None
+    return dict(result, part=part, next_cursor=next_cursor)
+
+
+def _index_page(doc_ids, after):
+    """One page of a pair index's sorted doc_ids: (hash_ids, last hash_id or None)."""
+    start = bisect.bisect_right(doc_ids, after) if after is not None else 0
+    page = doc_ids[start:start + MAX_DOCS]
+    return page, (page[-1] if start + MAX_DOCS < len(doc_ids) else None)
+
+
+def find_pair_documents(email1, email2, aliases1=None, aliases2=None, cursor=None):
+    """One page of the documents linking two addresses.
+
+    Returns (hash_ids, next_cursor): up to MAX_DOCS hash_ids starting at
+    cursor (from the first document when None), and the cursor of the page
+    after, or None on the last page. Raises ValueError for a bad cursor.
+    """
+    state = decode_cursor(cursor)
+    # Fill in the dedup alias sets the client didn't send
+    canonical1, aliases1 = resolve_address(email1, aliases1)
+    canonical2, aliases2 = resolve_address(email2, aliases2)
+
+    check_cache_generation()
+    cache_key = (_pair_cache_key(email1, aliases1, email2, aliases2), cursor)
+    page = DOC_CACHE.get(cache_key)
+    if page is not None:
+        app.logger.info(f"Result cache hit: {email1} <-> {email2} ({len(page[0])} documents)")
+        return list(page[0]), page[1]
+
+    app.logger.info(f"Querying: {email1} <-> {email2} (part {state['part']})")
+    app.logger.info(f"  aliases1: {aliases1}")
+    app.logger.info(f"  aliases2: {aliases2}")
+
+    # Edge doc_ids published by the pipeline answer most pairs without a scan.
+    # A cursor stays on the path that issued it.
+    hash_ids, last, source = None, None, state["source"]
+    if source != "scan":
+        limit = MAX_DOCS + 1 if state["after"] is None else None
+        with STAGE_SECONDS.time(stage="pair_index"):
+            doc_ids = lookup_pair(get_pair_collection(), canonical1, canonical2, limit=limit)
+        if doc_ids:
+            app.logger.info("  answered from pair index")
+            hash_ids, last = _index_page(doc_ids, state["after"])
+            source = "pairs"
+        elif source == "pairs":
+            raise ValueError("cursor expired: the pair index changed, start again")
+    if hash_ids is None:
+        hash_ids, last = query_documents(email1, email2, aliases1, aliases2, state["after"])
+        source = "scan"
+
+    next_cursor = encode_cursor(state["part"] + 1, source, last) if last is not None else None
+    app.logger.info(f"Found {len(hash_ids)} documents" + (", more to follow" if next_cursor else ""))
+    DOC_CACHE.put(cache_key, (tuple(hash_ids), next_cursor))
+    return hash_ids, next_cursor
+
+
+def intersect_postings(sides):
+    """_ids, in order, of the documents mentioning every (email, aliases) side.
+
+    Postings are intersected smallest-first by doc_freq: the rarest
+    address's documents are fetched, and each further address is only
+    checked against the survivors by _id, so the candidate set only shrinks.
+    Addresses without a doc_freq go last. If even the rarest posting list
+    exceeds CANDIDATE_LIMIT, a single $and query over all sides is used.
+    """
+    coll = get_collection()
+    clauses = []
+    for email, aliases in sides:
+        freq = address_doc_freq(email)
+        clauses.append((freq if freq is not None else float("inf"), _side_clause(coll, email, aliases)))
+    clauses.sort(key=lambda c: c[0])
+
+    with STAGE_SECONDS.time(stage="mongo_query"):
+        ids = [doc["_id"] for doc in
+               coll.find(clauses[0][1], {"_id": 1}).sort("_id", 1).limit(CANDIDATE_LIMIT + 1)]
+        if len(ids) > CANDIDATE_LIMIT:
+            query = {"$and": [clause for _, clause in clauses]}
+            # The caller keeps MAX_DOCS; one more tells it the set was truncated
+            return [doc["_id"] for doc in
+                    coll.find(query, {"_id": 1}).sort("_id", 1).limit(MAX_DOCS + 1)]
+        for _, clause in clauses[1:]:
+            if not ids:
+                break
+            query = {"$and": [{"_id": {"$in": ids}}, clause]}
+            ids = [doc["_id"] for doc in coll.find(query, {"_id": 1}).sort("_id", 1)]
+    return ids
+
+
+def find_group_documents(emails, aliases=None):
+    """Hash_ids shared by every address in a group, up to MAX_DOCS.
+
+    aliases, if given, is a list of client alias lists parallel to emails.
+    Returns (hash_ids, truncated).
+    """
+    aliases = aliases or [None] * len(emails)
+    sides = [(email, resolve_address(email, a)[1]) for email, a in zip(emails, aliases)]
+
+    check_cache_generation()
+    cache_key = ("group", tuple(sorted(_side_cache_key(email, a) for email, a in sides)))
+    cached = DOC_CACHE.get(cache_key)
+    if cached is not None:
+        app.logger.info(f"Result cache hit: group of {len(emails)} ({len(cached[0])} documents)")
+        return list(cached[0]), cached[1]
+
+    app.logger.info(f"Querying group: {', '.join(emails)}")
+    ids = intersect_postings(sides)
+    truncated = len(ids) > MAX_DOCS
+    hash_ids = []
+    if ids:
+        with STAGE_SECONDS.time(stage="mongo_query"):
+            cursor = get_collection().find({"_id": {"$in": ids[:MAX_DOCS]}}, {"hash_id": 1}).sort("_id", 1)
+            hash_ids = [str(doc["hash_id"]) for doc in cursor if doc.get("hash_id")]
+
+    app.logger.info(f"Found {len(ids)} shared documents" + (", truncated" if truncated else ""))
+    DOC_CACHE.put(cache_key, (tuple(hash_ids), truncated))
+    return hash_ids, truncated
+
+
+def document_manifest(hash_ids):
+    """CDN URL and year for each hash_id, in hash_ids order."""
+    years = {}
+    cursor = get_collection().find({"hash_id": {"$in": hash_ids}}, {"hash_id": 1, "year": 1})
+    for doc in cursor:
+        years[str(doc.get("hash_id"))] = doc.get("year")
+    return [{"hash_id": hid, "url": build_pdf_url(hid), "year": years.get(hid)}
+            for hid in hash_ids]
+
+
+def build_correspondence(job, email1, email2, aliases1, aliases2, cursor=None):
+    """Find one page of a pair's documents and return a presigned URL for its zip part.
+
+    Builds and uploads the part unless it is already on S3, reporting
+    progress on job. Returns the response dict for the client, with the
+    cursor of the next part (None on the last).
+    """
+    job.phase = "searching"
+    hash_ids, next_cursor = find_pair_documents(email1, email2, aliases1, aliases2, cursor)
+    return dict(zip_documents(job, hash_ids), part=job.part, next_cursor=next_cursor)
+
+
+def build_group(job, emails, aliases):
+    """Find the documents shared by a group and return them with a URL for their zip."""
+    job.phase = "searching"
+    hash_ids, truncated = find_group_documents(emails, aliases)
+    return dict(zip_documents(job, hash_ids), hash_ids=hash_ids, truncated=truncated)
+
+
+def zip_documents(job, hash_ids):
+    """Response dict for a zip of hash_ids at job.s3_key, building it if needed."""
+    job.doc_count = len(hash_ids)
+    if not hash_ids:
+        return {"success": True, "doc_count": 0, "download_url": None}
+    result = cached_zip(job.s3_key, hash_ids)
+    if result is not None:
+        return result
+    # Another process may be building this zip; wait for it, then find it on S3
+    with build_lock(job.s3_key):
+        return build_zip(job, job.s3_key, hash_ids)
+
+
+def manifest_key(s3_key):
+    return f"{s3_key}.manifest.json"
+
+
+def read_manifest(s3, s3_key):
+    """A cached zip's manifest, or None for a zip without one.
+
+    The manifest is {"hash_ids": set of hash_ids in the zip, "failed":
+    {hash_id: retry-after timestamp}} for PDFs that could not be downloaded.
+    """
+    try:
+        obj = s3.get_object(Bucket=S3_BUCKET, Key=manifest_key(s3_key))
+    except ClientError:
+        return None
+    data = json.loads(obj["Body"].read())
+    return {"hash_ids": set(data["hash_ids"]), "failed": data.get("failed", {})}
+
+
+def write_manifest(s3, s3_key, manifest):
+    body = json.dumps({"hash_ids": sorted(manifest["hash_ids"]), "failed": manifest["failed"],
+                       "updated": time.time()})
+    s3.put_object(Bucket=S3_BUCKET, Key=manifest_key(s3_key), Body=body.encode(),
+                  ContentType="application/json")
+
+
+def missing_documents(manifest, hash_ids):
+    """hash_ids neither in the zip nor failed recently enough to be skipped."""
+    now = time.time()
+    failed = manifest["failed"]
+    return [h for h in hash_ids if h not in manifest["hash_ids"] and failed.get(h, 0) <= now]
+
+
+def stale_documents(manifest, hash_ids):
+    """Zipped documents that are no longer on the page the zip is built for.
+
+    Pair index pages are cut by sorted hash_id, so a republished index can
+    shift documents between parts; such a zip is rebuilt, not appended to.
+    """
+    return manifest["hash_ids"].difference(hash_ids)
+
+
+def _retry_after(hash_ids):
+    retry = time.time() + FAILED_RETRY_AFTER
+    return {h: retry for h in hash_ids}
+
+
+def presigned_url(s3, s3_key):
+    return s3.generate_presigned_url(
+        "get_object", Params={"Bucket": S3_BUCKET, "Key": s3_key},
+        ExpiresIn=PRESIGN_EXPIRY)
+
+
+def _zip_pdfs(job, zf, hash_ids, writer=None, fetch=fetch_pdf):
+    """Download hash_ids into an open zip; returns the hash_ids written."""
+    added = []
+    for hid, pdf_data in iter_pdfs(hash_ids, fetch):
+        if pdf_data is not None:
+            with STAGE_SECONDS.time(stage="zip_write"):
+                zf.writestr(f"{hid}.pdf", pdf_data, compress_type=pdf_compress_type(pdf_data))
+            added.append(hid)
+            job.downloaded += 1
+            PDFS_ZIPPED.inc(result="added")
+        else:
+            job.failed += 1
+            PDFS_ZIPPED.inc(result="failed")
+        if writer is not None:
+            job.bytes_uploaded = writer.bytes_uploaded
+    stats = PDF_CACHE.stats()
+    app.logger.info(f"PDF cache: {stats['hits']} hits, {stats['misses']} misses "
+                    f"({stats['hit_rate']:.0%}), {stats['bytes_saved'] / 1e6:.1f} MB saved")
+    return added
+
+
+def build_zip(job, s3_key, hash_ids):
+    """Bring the zip at s3_key up to date with hash_ids; returns the response dict.
+
+    A zip with a manifest only gets the PDFs it is missing appended; PDFs
+    that failed to download are retried after FAILED_RETRY_AFTER. A zip
+    holding documents that have moved off its page is rebuilt, so parts
+    never overlap or grow past MAX_DOCS. A legacy zip without a manifest is
+    served as it is.
+    """
+    s3 = get_s3()
+    try:
+        with STAGE_SECONDS.time(stage="s3_head"):
+            s3.head_object(Bucket=S3_BUCKET, Key=s3_key)
+    except ClientError:
+        return create_zip(job, s3, s3_key, hash_ids)
+
+    with STAGE_SECONDS.time(stage="s3_manifest"):
+        manifest = read_manifest(s3, s3_key)
+    if manifest is None:
+        url = presigned_url(s3, s3_key)
+        cache_zip(s3_key, None, url)
+        return {"success": True, "doc_count": len(hash_ids), "download_url": url, "cached": True}
+    stale = stale_documents(manifest, hash_ids)
+    if stale:
+        app.logger.info(f"Rebuilding {s3_key}: {len(stale)} documents moved to another part")
+        return create_zip(job, s3, s3_key, hash_ids)
+    missing = missing_documents(manifest, hash_ids)
+    if not missing:
+        url = presigned_url(s3, s3_key)
+        cache_zip(s3_key, manifest, url)
+        return {"success": True, "doc_count": len(manifest["hash_ids"]), "download_url": url,
+                "cached": True}
+    try:
+        return append_zip(job, s3, s3_key, manifest, missing)
+    except ClientError as e:
+        return {"success": False, "error": str(e)}
+
+
+def create_zip(job, s3, s3_key, hash_ids):
+    # Zip straight into a multipart upload: no temp file, and parts go up
+    # while later PDFs are still downloading.
+    job.phase = "downloading"
+    writer = S3MultipartWriter(s3, S3_BUCKET, s3_key)
+    try:
+        with zipfile.ZipFile(writer, "w") as zf:
+            added = _zip_pdfs(job, zf, hash_ids, writer)
+
+        if not added:
+            writer.abort()
+            return {"success": True, "doc_count": 0, "download_url": None}
+
+        job.phase = "uploading"
+        writer.close()
+        job.bytes_uploaded = writer.bytes_uploaded
+        manifest = {"hash_ids": set(added),
+                    "failed": _retry_after(set(hash_ids).difference(added))}
+        write_manifest(s3, s3_key, manifest)
+        url = presigned_url(s3, s3_key)
+        cache_zip(s3_key, manifest, url)
+        return {"success": True, "doc_count": len(added), "download_url": url}
+    except ClientError as e:
+        writer.abort()
+        return {"success": False, "error": str(e)}
+    except Exception:
+        writer.abort()
+        raise
+
+
+def append_zip(job, s3, s3_key, manifest, missing):
+    """Append the missing PDFs to a cached zip and re-upload it."""
+    app.logger.info(f"Refreshing {s3_key}: {len(manifest['hash_ids'])} cached, {len(missing)} new")
+    # Fetch into the PDF cache first, so a pair whose new PDFs all fail
+    # costs no zip download or upload. The zip pass re-reads them from the
+    # cache without counting a second lookup.
+    job.phase = "downloading"
+    fetched = []
+    for hid, pdf_data in iter_pdfs(missing):
+        if pdf_data is not None:
+            fetched.append(hid)
+    included = set(manifest["hash_ids"])
+    added = []
+    if fetched:
+        job.phase = "updating"
+        with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_BYTES) as f:
+            with STAGE_SECONDS.time(stage="s3_download"):
+                s3.download_fileobj(S3_BUCKET, s3_key, f)
+            with zipfile.ZipFile(f, "a") as zf:
+                # A zip uploaded just before its manifest write failed may already hold some
+                present = {name[:-4] for name in zf.namelist() if name.endswith(".pdf")}
+                included.update(h for h in fetched if h in present)
+                added = _zip_pdfs(job, zf, [h for h in fetched if h not in present],
+                                  fetch=fetch_prefetched_pdf)
+            if added:
+                job.phase = "uploading"
+                job.bytes_uploaded = f.tell()
+                f.seek(0)
+                with STAGE_SECONDS.time(stage="s3_upload"):
+                    s3.upload_fileobj(f, S3_BUCKET, s3_key)
+                S3_UPLOAD_BYTES.inc(job.bytes_uploaded)
+    included.update(added)
+    failed = [h for h in missing if h not in included]
+    job.failed += len(missing) - len(fetched)  # _zip_pdfs counted its own failures
+    updated = {"hash_ids": included,
+               "failed": {h: t for h, t in manifest["failed"].items() if h not in included}}
+    updated["failed"].update(_retry_after(failed))
+    if updated != manifest:
+        write_manifest(s3, s3_key, updated)
+    url = presigned_url(s3, s3_key)
+    cache_zip(s3_key, updated, url)
+    return {"success": True, "doc_count": len(included), "download_url": url,
+            "cached": True, "added": len(added)}
+
+
 @app.route("/api/fetch-correspondence", methods=["POST"])
 def fetch_correspondence():
+    """Start a zip build and return its job ID; poll the status URL for the result.
+
+    Concurrent requests for the same pair share one job, and a pair whose
+    documents and zip are both in the result cache is answered directly,
+    without a job. Send "wait": true
+    to block until the build finishes and get the result in the response.
+    With "mode": "manifest", nothing is downloaded: the matched documents'
+    CDN URLs and years are returned straight away.
+
+    Each call covers one page of at most MAX_DOCS documents, zipped as one
+    numbered part. A response's "next_cursor", sent back as "cursor",
+    fetches the next page; it is null on the last one.
+    """
     data = request.get_json()
     email1 = data.get("email1", "")
     email2 = data.get("email2", "")
     aliases1 = data.get("aliases1")
     aliases2 = data.get("aliases2")
+    mode = data.get("mode", "zip")
+    cursor = data.get("cursor")
     if not email1 or not email2:
         return jsonify(success=False, error="email1 and email2 are required"), 400
+    if mode not in ("zip", "manifest"):
+        return jsonify(success=False, error=f"unknown mode: {mode}"), 400
+    try:
+        part = decode_cursor(cursor)["part"]
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
 
-    # Use aliases if provided (to match OCR variants in document text)
-    if aliases1 and len(aliases1) > 1:
-        regex1 = build_aliases_regex(aliases1)
-    else:
-        regex1 = build_email_regex(email1)
+    if mode == "manifest":
+        try:
+            hash_ids, next_cursor = find_pair_documents(email1, email2, aliases1, aliases2, cursor)
+        except ValueError as e:
+            return jsonify(success=False, error=str(e)), 400
+        return jsonify(success=True, doc_count=len(hash_ids), documents=document_manifest(hash_ids),
+                       part=part, next_cursor=next_cursor)
 
-    if aliases2 and len(aliases2) > 1:
-        regex2 = build_aliases_regex(aliases2)
-    else:
-        regex2 = build_email_regex(email2)
-
-    app.logger.info(f"Querying: {email1} <-> {email2}")
-    if aliases1:
-        app.logger.info(f"  aliases1: {aliases1}")
-    if aliases2:
-        app.logger.info(f"  aliases2: {aliases2}")
-
-    client = MongoClient(MONGO_URI)
-    db = client[MONGO_DB]
-    coll = db[MONGO_COLLECTION]
-    query = {"$and": [
-        {"text": {"$regex": regex1, "$options": "i"}},
-        {"text": {"$regex": regex2, "$options": "i"}},
-    ]}
-    cursor = coll.find(query, {"hash_id": 1}).limit(MAX_DOCS)
-    hash_ids = [str(doc["hash_id"]) for doc in cursor if doc.get("hash_id")]
-    client.close()
-
-    app.logger.info(f"Found {len(hash_ids)} documents")
+    # Repeat clicks on a pair whose zip is current need no job at all
+    cached = cached_correspondence(email1, email2, aliases1, aliases2, cursor)
+    if cached is not None:
+        return jsonify(cached)
 
-    if not hash_ids:
-        return jsonify(success=True, doc_count=0, download_url=None)
+    job = submit_job(email1, email2, aliases1, aliases2, cursor)
+    if data.get("wait"):
+        job.done.wait()
+        if job.state == "error":
+            return jsonify(success=False, error=job.error), 500
+        return jsonify(job.result), (200 if job.result["success"] else 500)
 
-    s3_key = f"{S3_PREFIX}/{'___'.join(sorted([email1, email2]))}.zip"
-    try:
-        s3 = boto3.client("s3")
-        s3.head_object(Bucket=S3_BUCKET, Key=s3_key)
-        url = s3.generate_presigned_url(
-            "get_object", Params={"Bucket": S3_BUCKET, "Key": s3_key},
-            ExpiresIn=PRESIGN_EXPIRY)
-        return jsonify(success=True, doc_count=len(hash_ids), download_url=url, cached=True)
-    except ClientError:
-        pass
+    return jsonify(success=True, job_id=job.id,
+                   status_url=f"api/fetch-correspondence/{job.id}"), 202
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        zip_path = os.path.join(tmpdir, "correspondence.zip")
-        pdf_count = 0
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-            for i, hid in enumerate(hash_ids):
-                try:
-                    req = urllib.request.Request(build_pdf_url(hid),
-                        headers={"User-Agent": "EmailExplorer/1.0"})
-                    with urllib.request.urlopen(req, timeout=30) as resp:
-                        zf.writestr(f"{hid}.pdf", resp.read())
-                    pdf_count += 1
-                except Exception as e:
-                    app.logger.warning(f"Failed {hid}: {e}")
-                if i < len(hash_ids) - 1:
-                    time.sleep(DOWNLOAD_DELAY)
 
-        if pdf_count == 0:
-            return jsonify(success=True, doc_count=0, download_url=None)
+@app.route("/api/fetch-group", methods=["POST"])
+def fetch_group():
+    """Zip the documents shared by every address in "emails" (2 to MAX_GROUP_SIZE).
 
-        try:
-            s3 = boto3.client("s3")
-            s3.upload_file(zip_path, S3_BUCKET, s3_key)
-            url = s3.generate_presigned_url(
-                "get_object", Params={"Bucket": S3_BUCKET, "Key": s3_key},
-                ExpiresIn=PRESIGN_EXPIRY)
-            return jsonify(success=True, doc_count=pdf_count, download_url=url)
-        except ClientError as e:
-            return jsonify(success=False, error=str(e)), 500
+    "aliases" may give a client alias list per address, in the same order.
+    Like /api/fetch-correspondence, returns a job to poll unless "wait" is
+    true; the result also lists the shared hash_ids. Groups are not
+    paginated: "truncated" is true when more than MAX_DOCS documents match.
+    """
+    data = request.get_json()
+    emails = list(dict.fromkeys(e for e in data.get("emails") or [] if e))
+    aliases = data.get("aliases")
+    if not 2 <= len(emails) <= MAX_GROUP_SIZE:
+        return jsonify(success=False,
+                       error=f"emails must list 2 to {MAX_GROUP_SIZE} distinct addresses"), 400
+    if aliases is not None and len(aliases) != len(data["emails"]):
+        return jsonify(success=False, error="aliases must parallel emails"), 400
+    if aliases is not None:
+        # Keep the alias list of each address's first occurrence
+        by_email = {}
+        for email, a in zip(data["emails"], aliases):
+            by_email.setdefault(email, a)
+        aliases = [by_email[email] for email in emails]
+
+    job = submit_group_job(emails, aliases)
+    if data.get("wait"):
+        job.done.wait()
+        if job.state == "error":
+            return jsonify(success=False, error=job.error), 500
+        return jsonify(job.result), (200 if job.result["success"] else 500)
+
+    return jsonify(success=True, job_id=job.id,
+                   status_url=f"api/fetch-correspondence/{job.id}"), 202
+
+
+@app.route("/api/fetch-correspondence/<job_id>", methods=["GET"])
+def correspondence_status(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify(success=False, error="unknown job"), 404
+    return jsonify(success=True, **job.to_dict())
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape target: stage latencies, byte counts, cache hits and failures."""
+    return app.response_class(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark flat vs trie-factored alias regexes on high-alias nodes.
+
+Takes the nodes with the most aliases from a network file and builds each
+node's regex both ways (alias_regex.build_flat_aliases_regex and
+alias_regex.build_aliases_regex). It then times a case-insensitive search of
+every document with each. Documents are synthetic email pages by default:
+headers drawn from the network's addresses, some with OCR-style domain
+noise, plus filler text. Match counts must agree, because the two forms
+match the same texts.
+
+With --mongo-uri, each regex is instead timed as the `$regex` count query
+the app runs, against a real collection.
+
+Usage:
+    python bench_alias_regex.py                        # Top 20 nodes, 20k synthetic docs
+    python bench_alias_regex.py --nodes 50 --docs 50000
+    python bench_alias_regex.py --mongo-uri mongodb://localhost:27017 --db test --collection edgifoia
+    python bench_alias_regex.py --output bench_alias_regex.json
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+
+from alias_regex import build_aliases_regex, build_flat_aliases_regex, reduce_aliases
+from dedup_network import DEFAULT_INPUT, iter_network_items
+
+_FILLER = ("the of and to in for on with is that this as be by from at regarding "
+           "meeting draft comments review attached please thanks epa rule "
+           "agency office call schedule follow up").split()
+_DOMAIN_NOISE = ("", "", "", "mail.", "epamail.")
+
+
+def load_alias_nodes(network_path):
+    """(id, aliases) for every node, most aliases first."""
+    nodes = [(node["id"], node.get("aliases") or [node["id"]])
+             for node in iter_network_items(network_path, "nodes")]
+    nodes.sort(key=lambda x: (-len(x[1]), x[0]))
+    return nodes
+
+
+def generate_documents(addresses, n_docs, seed=0, words=300):
+    """Synthetic email pages mentioning random network addresses."""
+    rng = random.Random(seed)
+    docs = []
+    for _ in range(n_docs):
+        header = []
+        for field in ("From", "To", "Cc"):
+            local, domain = rng.choice(addresses).split("@", 1)
+            header.append(f"{field}: {local}@{rng.choice(_DOMAIN_NOISE)}{domain}")
+        body = " ".join(rng.choice(_FILLER) for _ in range(words))
+        docs.append("\n".join(header) + "\n\n" + body)
+    return docs
+
+
+def time_regex(pattern, docs):
+    """(seconds, matches) for one case-insensitive search of every document."""
+    compiled = re.compile(pattern, re.IGNORECASE)
+    start = time.perf_counter()
+    matches = sum(1 for doc in docs if compiled.search(doc))
+    return time.perf_counter() - start, matches
+
+
+def time_mongo(coll, pattern):
+    start = time.perf_counter()
+    count = coll.count_documents({"text": {"$regex": pattern, "$options": "i"}})
+    return time.perf_counter() - start, count
+
+
+def run_benchmark(network_path, n_nodes=20, n_docs=20000, seed=0, coll=None):
+    all_nodes = load_alias_nodes(network_path)
+    nodes = all_nodes[:n_nodes]
+    docs = None
+    if coll is None:
+        addresses = [a for _, aliases in all_nodes for a in aliases if "@" in a]
+        docs = generate_documents(addresses, n_docs, seed)
+
+    results = []
+    for node_id, aliases in nodes:
+        flat = build_flat_aliases_regex(aliases)
+        trie = build_aliases_regex(aliases)
+        if coll is None:
+            flat_time, flat_matches = time_regex(flat, docs)
+            trie_time, trie_matches = time_regex(trie, docs)
+        else:
+            flat_time, flat_matches = time_mongo(coll, flat)
+            trie_time, trie_matches = time_mongo(coll, trie)
+        if flat_matches != trie_matches:
+            raise AssertionError(f"{node_id}: flat matched {flat_matches}, trie {trie_matches}")
+        results.append({
+            "id": node_id,
+            "aliases": len(aliases),
+            "kept_aliases": len(reduce_aliases(aliases)),
+            "flat_len": len(flat),
+            "trie_len": len(trie),
+            "flat_time": flat_time,
+            "trie_time": trie_time,
+            "matches": flat_matches,
+        })
+        print(f"  {node_id:<40} {len(aliases):>4} aliases  "
+              f"flat {flat_time:7.3f}s  trie {trie_time:7.3f}s  "
+              f"({flat_time / max(trie_time, 1e-9):.1f}x)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark flat vs trie-factored alias regexes on high-alias nodes"
+    )
+    parser.add_argument("network", nargs="?", default=DEFAULT_INPUT,
+                        help=f"Network JSON file (default: {DEFAULT_INPUT})")
+    parser.add_argument("--nodes", type=int, default=20, help="Number of high-alias nodes (default: 20)")
+    parser.add_argument("--docs", type=int, default=20000, help="Synthetic documents (default: 20000)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--mongo-uri", default=None, help="Time $regex queries against MongoDB instead")
+    parser.add_argument("--db", default="test", help="Database name (with --mongo-uri)")
+    parser.add_argument("--collection", default="edgifoia", help="Collection name (with --mongo-uri)")
+    parser.add_argument("--output", "-o", default=None, help="Write results as JSON")
+
+    args = parser.parse_args()
+
+    coll = None
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        coll = MongoClient(args.mongo_uri)[args.db][args.collection]
+        print(f"Timing $regex queries on {args.db}.{args.collection}")
+    else:
+        print(f"Timing re.search over {args.docs} synthetic documents")
+
+    results = run_benchmark(args.network, args.nodes, args.docs, args.seed, coll)
+
+    flat_total = sum(r["flat_time"] for r in results)
+    trie_total = sum(r["trie_time"] for r in results)
+    print("\n=== Summary ===")
+    print(f"  Nodes: {len(results)}, aliases kept after subsumption: "
+          f"{sum(r['kept_aliases'] for r in results)}/{sum(r['aliases'] for r in results)}")
+    print(f"  Regex length: flat {sum(r['flat_len'] for r in results)}, "
+          f"trie {sum(r['trie_len'] for r in results)}")
+    print(f"  Query time: flat {flat_total:.2f}s, trie {trie_total:.2f}s "
+          f"({flat_total / max(trie_total, 1e-9):.1f}x)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
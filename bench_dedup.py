@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Benchmark dedup_network.py speed and quality on a labeled synthetic network.
+
+Generates networks of known people, each with a clean address plus OCR-style
+variants planted with the same corruptions the dedup layers undo
+(LOCAL_OCR_CHAR_MAP, EPA_ERROR_DOMAINS, DOMAIN_FIXES, mailto: prefixes,
+hyphen separators, split/concatenated locals, reordered names, typos).
+Every node carries a "person" label, so the merge groups from
+build_alias_map can be scored for pairwise precision and recall.
+
+Layers 3c and 4 compare addresses within each domain bucket, so run time
+grows with the square of the largest bucket (epa.gov, EPA_SHARE of the
+people). build_alias_map took about 2.4s at 5k nodes, 9.5s at 10k and 44s
+at 20k, which projects to roughly 20 minutes at 100k and over a day at 1M.
+Each size runs under --time-limit; once one exceeds it, larger sizes are
+skipped.
+
+Usage:
+    python bench_dedup.py                             # 2k, 10k, 20k nodes
+    python bench_dedup.py --sizes 10000               # Quick run
+    python bench_dedup.py --sizes 100000 --time-limit 0   # No limit (~20 min)
+    python bench_dedup.py --sizes 10000 --no-fuzzy    # Skip Layer 4
+    python bench_dedup.py --sizes 10000 --backend python
+    python bench_dedup.py --save-network bench_10k.json --sizes 10000
+    python bench_dedup.py --output bench_dedup.json   # Write results as JSON
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import signal
+import string
+import sys
+import time
+from collections import Counter
+
+import dedup_network
+from dedup_network import (
+    DOMAIN_FIXES,
+    EPA_ERROR_DOMAINS,
+    LOCAL_OCR_CHAR_MAP,
+    DedupProfiler,
+    _COMMON_FIRST_NAMES,
+    build_alias_map,
+    merge_edges,
+    merge_nodes,
+    set_distance_backend,
+)
+
+BENCH_SIZES = (2000, 10000, 20000)
+TIME_LIMIT = 300  # seconds per size
+
+# Share of people on epa.gov (the largest bucket in the real network)
+EPA_SHARE = 0.35
+
+# Clean character -> OCR garbles of it (inverse of LOCAL_OCR_CHAR_MAP)
+_LOCAL_GARBLES = {}
+for _err, _fix in LOCAL_OCR_CHAR_MAP.items():
+    _LOCAL_GARBLES.setdefault(_fix, []).append(_err)
+
+# Clean domain -> known garbles of it (inverse of DOMAIN_FIXES)
+_DOMAIN_GARBLES = {}
+for _err, _fix in DOMAIN_FIXES.items():
+    if _err != _fix:
+        _DOMAIN_GARBLES.setdefault(_fix, []).append(_err)
+
+# Generic TLD garbles handled by normalize_domain's suffix rules
+_TLD_GARBLES = {
+    '.com': ['.corn', '.eom', '.coml'],
+    '.org': ['.orq', '.ora', '.orgl'],
+    '.gov': ['.qov', '.aov', '.goy', '.govl'],
+    '.edu': ['.edul'],
+}
+
+_FIRST_NAMES = sorted(_COMMON_FIRST_NAMES)
+_SYLLABLES = ['an', 'ber', 'cal', 'der', 'est', 'for', 'gan', 'hol', 'ing', 'jor',
+              'kel', 'lan', 'mor', 'nel', 'ost', 'par', 'quin', 'ros', 'sten', 'tor',
+              'ul', 'van', 'wel', 'xan', 'yor', 'zel', 'bre', 'cot', 'dal', 'fer']
+
+
+# ---------------------------------------------------------------------------
+# Synthetic network generation
+# ---------------------------------------------------------------------------
+
+def _last_name(rng):
+    return ''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 3)))
+
+
+def _org_domain(rng):
+    letters = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 12)))
+    return letters + rng.choice(['.com', '.com', '.org', '.gov', '.edu'])
+
+
+def _replace_one(rng, text, old, new):
+    """Replace one random occurrence of old in text."""
+    positions = [i for i in range(len(text)) if text.startswith(old, i)]
+    if not positions:
+        return text
+    i = rng.choice(positions)
+    return text[:i] + new + text[i + len(old):]
+
+
+def _corrupt_local(rng, local, kind):
+    if kind == "local_ocr":
+        candidates = [c for c in _LOCAL_GARBLES if c in local]
+        if candidates:
+            c = rng.choice(candidates)
+            return _replace_one(rng, local, c, rng.choice(_LOCAL_GARBLES[c]))
+    elif kind == "hyphen" and '.' in local:
+        return local.replace('.', '-')
+    elif kind == "reorder" and '.' in local:
+        first, rest = local.split('.', 1)
+        return f"{rest}.{first}"
+    elif kind == "concat" and '.' in local:
+        return local.replace('.', '')
+    elif kind == "split":
+        parts = local.split('.')
+        longest = max(range(len(parts)), key=lambda k: len(parts[k]))
+        p = parts[longest]
+        if len(p) >= 6:
+            cut = rng.randint(3, len(p) - 3)
+            parts[longest] = p[:cut] + '.' + p[cut:]
+            return '.'.join(parts)
+    elif kind == "typo" and len(local) >= 8:
+        i = rng.randrange(1, len(local) - 1)
+        if local[i].isalpha():
+            return local[:i] + rng.choice(string.ascii_lowercase) + local[i + 1:]
+    return local
+
+
+def _corrupt_domain(rng, domain):
+    if domain == 'epa.gov':
+        return rng.choice(sorted(EPA_ERROR_DOMAINS))
+    if domain in _DOMAIN_GARBLES:
+        return rng.choice(_DOMAIN_GARBLES[domain])
+    for tld, garbles in _TLD_GARBLES.items():
+        if domain.endswith(tld):
+            return domain[:-len(tld)] + rng.choice(garbles)
+    return domain
+
+
+VARIANT_KINDS = ("local_ocr", "domain", "mailto", "hyphen", "reorder",
+                 "concat", "split", "typo")
+
+
+def make_variant(rng, local, domain):
+    """Apply one or two random OCR-style corruptions to an address."""
+    kinds = rng.sample(VARIANT_KINDS, rng.choice([1, 1, 2]))
+    prefix = ''
+    for kind in kinds:
+        if kind == "domain":
+            domain = _corrupt_domain(rng, domain)
+        elif kind == "mailto":
+            prefix = rng.choice(['mailto:', 'rnailto:', 'mailtoi'])
+        else:
+            local = _corrupt_local(rng, local, kind)
+    return f"{prefix}{local}@{domain}"
+
+
+def _node(email, name, domain, count, rng, person):
+    sent = rng.randint(0, count)
+    first_year = rng.randint(2010, 2019)
+    return {
+        "id": email,
+        "name": name,
+        "domain": domain,
+        "sent": sent,
+        "received": count - sent,
+        "count": count,
+        "years": list(range(first_year, first_year + rng.randint(1, 3))),
+        "domain_count": rng.randint(0, 10),
+        "person": person,
+    }
+
+
+def generate_network(n_nodes, seed=0, edges_per_node=2):
+    """Generate a labeled network with about n_nodes nodes.
+
+    Returns a network dict ({"nodes", "edges"}) whose nodes carry a
+    "person" ground-truth label shared by a clean address and its variants.
+    """
+    rng = random.Random(seed)
+    org_domains = [_org_domain(rng) for _ in range(max(20, n_nodes // 400))]
+    org_domains += sorted(set(DOMAIN_FIXES.values()))
+
+    nodes = {}
+    seen_people = set()
+    person = 0
+    while len(nodes) < n_nodes:
+        first, last = rng.choice(_FIRST_NAMES), _last_name(rng)
+        if rng.random() < EPA_SHARE:
+            domain = 'epa.gov'
+            local = f"{last}.{first}"
+        else:
+            domain = rng.choice(org_domains)
+            local = f"{first}.{last}"
+        if (local, domain) in seen_people:
+            continue
+        seen_people.add((local, domain))
+        clean = f"{local}@{domain}"
+        if clean in nodes:
+            continue
+
+        label = f"p{person}"
+        person += 1
+        name = f"{first.title()} {last.title()}"
+        nodes[clean] = _node(clean, name, domain, rng.randint(5, 300), rng, label)
+
+        for _ in range(min(int(rng.expovariate(0.8)), 6)):
+            variant = make_variant(rng, local, domain)
+            if variant in nodes:
+                continue
+            variant_domain = variant.split('@', 1)[1]
+            variant_name = name if rng.random() < 0.6 else ""
+            nodes[variant] = _node(variant, variant_name, variant_domain,
+                                   rng.randint(1, 8), rng, label)
+
+    node_ids = list(nodes)
+    edges = {}
+    for _ in range(len(node_ids) * edges_per_node):
+        src, tgt = rng.choice(node_ids), rng.choice(node_ids)
+        if src == tgt:
+            continue
+        edge = edges.setdefault((src, tgt), {
+            "source": src, "target": tgt, "weight": 0, "years": set(), "doc_ids": set(),
+        })
+        edge["weight"] += 1
+        edge["years"].add(rng.randint(2010, 2020))
+        edge["doc_ids"].add('%032x' % rng.getrandbits(128))
+
+    return {
+        "nodes": list(nodes.values()),
+        "edges": [dict(e, years=sorted(e["years"]), doc_ids=sorted(e["doc_ids"]))
+                  for e in edges.values()],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Scoring
+# ---------------------------------------------------------------------------
+
+def _pairs(n):
+    return n * (n - 1) // 2
+
+
+def score_groups(best_id_groups, nodes_by_id):
+    """Pairwise precision/recall of merge groups against the person labels."""
+    truth_sizes = Counter(n["person"] for n in nodes_by_id.values())
+    cells = Counter()
+    predicted_pairs = 0
+    for group, members in enumerate(best_id_groups.values()):
+        predicted_pairs += _pairs(len(members))
+        for oid in members:
+            cells[(group, nodes_by_id[oid]["person"])] += 1
+    true_positive = sum(_pairs(c) for c in cells.values())
+    truth_pairs = sum(_pairs(c) for c in truth_sizes.values())
+
+    precision = true_positive / predicted_pairs if predicted_pairs else 1.0
+    recall = true_positive / truth_pairs if truth_pairs else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "people": len(truth_sizes),
+        "predicted_groups": len(best_id_groups),
+        "true_pairs": truth_pairs,
+        "predicted_pairs": predicted_pairs,
+        "correct_pairs": true_positive,
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(f1, 4),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+class BenchTimeout(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def time_limit(seconds):
+    """Raise BenchTimeout if the block runs past seconds (no limit for 0 or without SIGALRM)."""
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def expired(signum, frame):
+        raise BenchTimeout(f"exceeded {seconds:g}s")
+
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def run_benchmark(n_nodes, seed=0, no_fuzzy=False, save_network=None):
+    print(f"\n=== {n_nodes} nodes (seed={seed}) ===")
+    start = time.perf_counter()
+    network = generate_network(n_nodes, seed=seed)
+    gen_time = time.perf_counter() - start
+    nodes_by_id = {n["id"]: n for n in network["nodes"]}
+    print(f"  Generated {len(nodes_by_id)} nodes, {len(network['edges'])} edges "
+          f"in {gen_time:.1f}s")
+
+    if save_network:
+        with open(save_network, 'w') as f:
+            json.dump(network, f, separators=(',', ':'))
+        print(f"  Saved labeled network to {save_network}")
+
+    profiler = DedupProfiler()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        final_remap, best_id_groups = build_alias_map(
+            nodes_by_id, no_fuzzy=no_fuzzy, profile=profiler)
+    alias_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    merged_nodes = merge_nodes(best_id_groups, nodes_by_id)
+    merged_edges = merge_edges(network["edges"], final_remap)
+    merge_time = time.perf_counter() - start
+
+    quality = score_groups(best_id_groups, nodes_by_id)
+    profile = profiler.to_dict()
+    for layer in profile["layers"]:
+        layer["buckets"] = layer["buckets"][:10]
+
+    profiler.print_summary()
+    print(f"  build_alias_map: {alias_time:.2f}s, merge nodes+edges: {merge_time:.2f}s")
+    print(f"  {quality['people']} people -> {quality['predicted_groups']} groups "
+          f"({len(merged_nodes)} nodes, {len(merged_edges)} edges)")
+    print(f"  Precision: {quality['precision']:.4f}  Recall: {quality['recall']:.4f}  "
+          f"F1: {quality['f1']:.4f}")
+
+    return {
+        "nodes": len(nodes_by_id),
+        "edges": len(network["edges"]),
+        "seed": seed,
+        "no_fuzzy": no_fuzzy,
+        "distance_backend": dedup_network.DISTANCE_BACKEND,
+        "generate_time": round(gen_time, 3),
+        "alias_map_time": round(alias_time, 3),
+        "merge_time": round(merge_time, 3),
+        "quality": quality,
+        "profile": profile,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark dedup speed and quality on a labeled synthetic network"
+    )
+    parser.add_argument(
+        "--sizes", default=",".join(str(s) for s in BENCH_SIZES),
+        help=f"Comma-separated node counts (default: {','.join(str(s) for s in BENCH_SIZES)})"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--no-fuzzy", action="store_true", help="Skip Layer 4")
+    parser.add_argument(
+        "--backend", default="auto", choices=["auto", "python", "rapidfuzz"],
+        help="Distance function backend (default: auto)"
+    )
+    parser.add_argument(
+        "--time-limit", type=float, default=TIME_LIMIT, metavar="SECONDS",
+        help=f"Per-size limit; larger sizes are skipped once one exceeds it, 0 for none "
+             f"(default: {TIME_LIMIT})"
+    )
+    parser.add_argument("--output", "-o", default=None, help="Write results as JSON")
+    parser.add_argument(
+        "--save-network", default=None, metavar="PATH",
+        help="Also write each labeled network (suffixed with its size when running several)"
+    )
+
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    try:
+        backend = set_distance_backend(args.backend)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Distance backend: {backend}")
+
+    results = []
+    timed_out = None  # smallest size that ran past the limit
+    for n in sizes:
+        if timed_out is not None and n >= timed_out:
+            print(f"\n=== {n} nodes: skipped ({timed_out} nodes exceeded "
+                  f"{args.time_limit:g}s) ===")
+            continue
+        save = None
+        if args.save_network:
+            stem, ext = os.path.splitext(args.save_network)
+            save = args.save_network if len(sizes) == 1 else f"{stem}-{n}{ext}"
+        try:
+            with time_limit(args.time_limit):
+                results.append(run_benchmark(n, seed=args.seed, no_fuzzy=args.no_fuzzy,
+                                             save_network=save))
+        except BenchTimeout as e:
+            print(f"  Stopped: {n} nodes {e} (raise --time-limit to run it)")
+            timed_out = n
+
+    print("\n=== Summary ===")
+    print(f"  {'nodes':>9} {'alias_map(s)':>13} {'merge(s)':>9} {'precision':>10} {'recall':>8}")
+    for r in results:
+        print(f"  {r['nodes']:>9} {r['alias_map_time']:>13.2f} {r['merge_time']:>9.2f} "
+              f"{r['quality']['precision']:>10.4f} {r['quality']['recall']:>8.4f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,23 +11,53 @@ Usage:
     python dedup_network.py --dry-run --report       # Print merge groups
     python dedup_network.py --no-fuzzy               # Skip Layer 4
     python dedup_network.py --output cleaned.json    # Write to different file
+    python dedup_network.py --external-sort          # Disk-backed edge merge
+    python dedup_network.py --dry-run --profile      # Write dedup_profile.json
+    python dedup_network.py --profile --profile-output prof.json
+    python dedup_network.py --backend python         # Force stdlib distance functions
+    python dedup_network.py --check-backend          # Verify backend score parity
 """
 
 import argparse
+import heapq
 import json
 import os
+import random
 import re
 import shutil
 import sys
+import tempfile
+import time
 from collections import defaultdict
+from contextlib import contextmanager
 from itertools import permutations
 
+# Optional: incremental JSON parsing keeps peak memory bounded on large networks
+# pip install ijson
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+
+# Optional: compiled edit distance, used automatically when importable
+# pip install rapidfuzz
+try:
+    from rapidfuzz.distance import Levenshtein as _RapidfuzzLevenshtein
+    HAS_RAPIDFUZZ = True
+except ImportError:
+    HAS_RAPIDFUZZ = False
+
 # ---------------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------------
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DEFAULT_INPUT = os.path.join(SCRIPT_DIR, "public", "email_network.json")
+DEFAULT_PROFILE_OUTPUT = "dedup_profile.json"
+
+# Same separators as the json.dump of the final output
+_COMPACT_JSON = json.JSONEncoder(separators=(',', ':'))
 
 # EPA OCR error domains (from extract_emails.py lines 174-189)
 EPA_ERROR_DOMAINS = {
@@ -266,10 +296,10 @@ MAILTO_RE = re.compile(
 
 
 # ---------------------------------------------------------------------------
-# Levenshtein distance (stdlib-only implementation)
+# Distance functions (stdlib implementations + pluggable backend)
 # ---------------------------------------------------------------------------
 
-def levenshtein(s, t):
+def _py_levenshtein(s, t):
     """Compute Levenshtein edit distance between two strings."""
     if s == t:
         return 0
@@ -289,7 +319,7 @@ def levenshtein(s, t):
     return prev[len(t)]
 
 
-def jaro_winkler(s1, s2):
+def _py_jaro_winkler(s1, s2):
     """Compute Jaro-Winkler similarity between two strings."""
     if s1 == s2:
         return 1.0
@@ -344,6 +374,244 @@ def jaro_winkler(s1, s2):
     return jaro + prefix * 0.1 * (1 - jaro)
 
 
+# Each backend provides levenshtein and jaro_winkler with scores identical to
+# the stdlib implementations above (see check_backend_parity).
+DISTANCE_BACKENDS = {
+    "python": {"levenshtein": _py_levenshtein, "jaro_winkler": _py_jaro_winkler},
+}
+if HAS_RAPIDFUZZ:
+    DISTANCE_BACKENDS["rapidfuzz"] = {
+        "levenshtein": _RapidfuzzLevenshtein.distance,
+        # rapidfuzz's Jaro-Winkler only boosts the prefix above 0.7 and counts
+        # transpositions differently, so its scores differ; keep ours.
+        "jaro_winkler": _py_jaro_winkler,
+    }
+
+DISTANCE_BACKEND = None
+levenshtein = _py_levenshtein
+jaro_winkler = _py_jaro_winkler
+
+
+def set_distance_backend(name="auto"):
+    """Select the distance backend by name; "auto" prefers rapidfuzz. Returns the name."""
+    global DISTANCE_BACKEND, levenshtein, jaro_winkler
+    if name == "auto":
+        name = "rapidfuzz" if "rapidfuzz" in DISTANCE_BACKENDS else "python"
+    if name not in DISTANCE_BACKENDS:
+        raise ValueError(f"Unknown or unavailable distance backend: {name} "
+                         f"(available: {', '.join(DISTANCE_BACKENDS)})")
+    backend = DISTANCE_BACKENDS[name]
+    levenshtein = backend["levenshtein"]
+    jaro_winkler = backend["jaro_winkler"]
+    DISTANCE_BACKEND = name
+    return name
+
+
+set_distance_backend()
+
+
+def _parity_samples(n, seed=0):
+    """Edge cases plus random email-like string pairs for parity checks."""
+    rng = random.Random(seed)
+    alphabet = 'abcdeilmnorvy013._-@ '
+    samples = [('', ''), ('', 'a'), ('a', ''), ('a', 'a'), ('ab', 'ba'),
+               ('epa', 'cpa'), ('smith.john', 'john.smith'), ('rnary', 'mary'),
+               ('jones.mary@epa.gov', 'jones.mary@epa.govl'), ('é', 'e')]
+    for _ in range(n):
+        a = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        if rng.random() < 0.5:
+            # Near-duplicate: a few random edits of a
+            b = list(a)
+            for _ in range(rng.randint(0, 3)):
+                if b and rng.random() < 0.5:
+                    del b[rng.randrange(len(b))]
+                else:
+                    b.insert(rng.randint(0, len(b)), rng.choice(alphabet))
+            b = ''.join(b)
+        else:
+            b = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        samples.append((a, b))
+    return samples
+
+
+def check_backend_parity(n=20000, seed=0):
+    """Compare every available backend against the stdlib implementations.
+
+    Returns a dict of backend name -> list of mismatching (function, a, b).
+    """
+    reference = DISTANCE_BACKENDS["python"]
+    samples = _parity_samples(n, seed)
+    mismatches = {}
+    for name, backend in DISTANCE_BACKENDS.items():
+        bad = []
+        for func in ("levenshtein", "jaro_winkler"):
+            if backend[func] is reference[func]:
+                continue
+            for a, b in samples:
+                if backend[func](a, b) != reference[func](a, b):
+                    bad.append((func, a, b))
+        mismatches[name] = bad
+    return mismatches
+
+
+# ---------------------------------------------------------------------------
+# Profiling
+# ---------------------------------------------------------------------------
+
+PROFILE_COUNTERS = ("candidate_pairs", "levenshtein_calls", "jaro_winkler_calls",
+                    "rewrites", "merges")
+
+# Active profiler while build_alias_map runs with profiling enabled
+_PROFILER = None
+
+
+class DedupProfiler:
+    """Wall time and comparison counters per dedup layer and per domain bucket.
+
+    Counts candidate pairs, levenshtein and jaro_winkler calls, addresses
+    rewritten by the normalization layers (1-3), and accepted merges. Counts
+    made while a bucket is set (Layer 4 sets it to the domain being
+    compared) are attributed to that bucket as well as the layer.
+    """
+
+    def __init__(self):
+        self.layers = {}  # layer name -> {"wall_time", "counters", "buckets"}
+        self._layer = None
+        self._bucket = None
+        self._start = None
+
+    def start_layer(self, name):
+        self._layer = self.layers.setdefault(name, {
+            "wall_time": 0.0,
+            "counters": dict.fromkeys(PROFILE_COUNTERS, 0),
+            "buckets": {},
+        })
+        self._bucket = None
+        self._start = time.perf_counter()
+
+    def end_layer(self):
+        self._layer["wall_time"] += time.perf_counter() - self._start
+        self._layer = None
+        self._bucket = None
+
+    def set_bucket(self, bucket):
+        self._bucket = bucket
+
+    def count(self, counter, n=1, bucket=None):
+        layer = self._layer
+        if layer is None:
+            return
+        layer["counters"][counter] += n
+        if bucket is None:
+            bucket = self._bucket
+        if bucket is not None:
+            counters = layer["buckets"].get(bucket)
+            if counters is None:
+                counters = layer["buckets"][bucket] = dict.fromkeys(PROFILE_COUNTERS, 0)
+            counters[counter] += n
+
+    def to_dict(self):
+        """JSON-serializable report; buckets sorted by distance calls, busiest first."""
+        layers = []
+        for name, layer in self.layers.items():
+            buckets = sorted(
+                layer["buckets"].items(),
+                key=lambda x: (-(x[1]["levenshtein_calls"] + x[1]["jaro_winkler_calls"]),
+                               -x[1]["candidate_pairs"], x[0]))
+            layers.append({
+                "layer": name,
+                "wall_time": round(layer["wall_time"], 6),
+                **layer["counters"],
+                "buckets": [{"bucket": b, **c} for b, c in buckets],
+            })
+        return {
+            "total_wall_time": round(sum(l["wall_time"] for l in self.layers.values()), 6),
+            "layers": layers,
+        }
+
+    def print_summary(self):
+        print("\n=== Profile ===")
+        print(f"  {'Layer':<40} {'time(s)':>8} {'pairs':>10} {'lev':>10} {'jw':>8} "
+              f"{'rewrites':>8} {'merges':>8}")
+        for name, layer in self.layers.items():
+            c = layer["counters"]
+            print(f"  {name:<40} {layer['wall_time']:>8.3f} {c['candidate_pairs']:>10} "
+                  f"{c['levenshtein_calls']:>10} {c['jaro_winkler_calls']:>8} "
+                  f"{c['rewrites']:>8} {c['merges']:>8}")
+
+    def write(self, path, **extra):
+        with open(path, 'w') as f:
+            json.dump({**extra, **self.to_dict()}, f, indent=2)
+
+
+@contextmanager
+def _profile_layer(name):
+    """Time a dedup layer on the active profiler (no-op when not profiling)."""
+    if _PROFILER is None:
+        yield
+        return
+    _PROFILER.start_layer(name)
+    try:
+        yield
+    finally:
+        _PROFILER.end_layer()
+
+
+def _profile_merges(merges):
+    """Record a layer's accepted merges, bucketed by the merged canonical's domain."""
+    if _PROFILER is None:
+        return
+    for src in merges:
+        _PROFILER.count("merges", bucket=src.split('@', 1)[1] if '@' in src else None)
+
+
+def _profile_rewrites(rewrites, prior_canonicals):
+    """Record a normalization layer's (old, new) rewrites.
+
+    Every rewrite counts under "rewrites"; only rewrites that collapse
+    canonicals into one count as merges: for each new canonical, the number
+    of distinct canonicals (rewritten, or already equal to it before the
+    layer) it now stands for, minus one.
+    """
+    if _PROFILER is None:
+        return
+    sources = defaultdict(set)
+    for old, new in rewrites:
+        sources[new].add(old)
+    for new, olds in sources.items():
+        bucket = new.split('@', 1)[1] if '@' in new else None
+        _PROFILER.count("rewrites", len(olds), bucket=bucket)
+        merged = len(olds) + (new in prior_canonicals) - 1
+        if merged:
+            _PROFILER.count("merges", merged, bucket=bucket)
+
+
+def _counting(func, counter):
+    def wrapper(*args):
+        _PROFILER.count(counter)
+        return func(*args)
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+@contextmanager
+def profiling(profiler):
+    """Activate profiler and count distance calls while the block runs.
+
+    The module-level levenshtein/jaro_winkler are swapped for counting
+    wrappers only for the duration, so unprofiled runs pay nothing.
+    """
+    global _PROFILER, levenshtein, jaro_winkler
+    saved = (_PROFILER, levenshtein, jaro_winkler)
+    _PROFILER = profiler
+    levenshtein = _counting(levenshtein, "levenshtein_calls")
+    jaro_winkler = _counting(jaro_winkler, "jaro_winkler_calls")
+    try:
+        yield profiler
+    finally:
+        _PROFILER, levenshtein, jaro_winkler = saved
+
+
 # ---------------------------------------------------------------------------
 # Layer 1: Structural Cleanup
 # ---------------------------------------------------------------------------
@@ -856,10 +1124,13 @@ def fuzzy_match_groups(nodes_by_id, alias_map, skip=False):
             domain_groups[domain].append(canon)
 
     uf = _UnionFind()
+    prof = _PROFILER
 
     for domain, canonicals in domain_groups.items():
         if len(canonicals) < 2:
             continue
+        if prof is not None:
+            prof.set_bucket(domain)
 
         # Pre-compute info for each canonical
         canon_info = []
@@ -889,6 +1160,9 @@ def fuzzy_match_groups(nodes_by_id, alias_map, skip=False):
                 if len_j - len_i > threshold:
                     break
 
+                if prof is not None:
+                    prof.count("candidate_pairs")
+
                 # Skip if already in the same set
                 if uf.find(ci) == uf.find(cj):
                     continue
@@ -928,6 +1202,9 @@ def fuzzy_match_groups(nodes_by_id, alias_map, skip=False):
 
                 uf.union(ci, cj)
 
+    if prof is not None:
+        prof.set_bucket(None)
+
     # Build merge map: for each group with >1 member, map non-representative
     # members to the representative (highest count canonical in the group)
     new_merges = {}
@@ -1110,6 +1387,90 @@ def concatenation_matches(alias_map, nodes_by_id):
     return new_merges
 
 
+# ---------------------------------------------------------------------------
+# Streaming Loader
+# ---------------------------------------------------------------------------
+
+class CompactNode:
+    """Slotted, read-only node record.
+
+    Holds only the fields the dedup layers read, and supports the dict-style
+    access (node["id"], node.get("count", 0)) they already use.
+    """
+    __slots__ = ("id", "name", "domain", "sent", "received", "count",
+                 "years", "domain_count", "doc_freq")
+
+    def __init__(self, data):
+        self.id = data["id"]
+        self.name = data.get("name")
+        domain = data.get("domain")
+        self.domain = sys.intern(domain) if domain else domain
+        self.sent = data.get("sent")
+        self.received = data.get("received")
+        self.count = data.get("count")
+        years = data.get("years")
+        self.years = tuple(years) if years is not None else None
+        self.domain_count = data.get("domain_count")
+        self.doc_freq = data.get("doc_freq")
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+
+# What reading a missing, truncated or half-written network file can raise
+NETWORK_READ_ERRORS = (OSError, ValueError) + ((ijson.JSONError,) if HAS_IJSON else ())
+
+
+def iter_network_items(path, key):
+    """Yield the items of a top-level array ("nodes" or "edges") in a network file.
+
+    With ijson installed the file is parsed incrementally, so only one item is
+    held in memory at a time. Otherwise falls back to json.load.
+    """
+    if HAS_IJSON:
+        with open(path, 'rb') as f:
+            yield from ijson.items(f, f"{key}.item", use_float=True)
+        return
+    with open(path, 'r') as f:
+        data = json.load(f)
+    items = data.get(key, [])
+    del data
+    yield from items
+
+
+def load_nodes(path):
+    """Load nodes from a network file into a dict of id -> CompactNode."""
+    nodes_by_id = {}
+    for node in iter_network_items(path, "nodes"):
+        nodes_by_id[node["id"]] = CompactNode(node)
+    return nodes_by_id
+
+
+def merge_sorted_unique(a, b):
+    """Merge two sorted, duplicate-free lists into one sorted, duplicate-free list."""
+    if not a:
+        return list(b)
+    if not b:
+        return a
+    if a[-1] < b[0]:
+        a.extend(b)
+        return a
+    merged = []
+    for x in heapq.merge(a, b):
+        if not merged or merged[-1] != x:
+            merged.append(x)
+    return merged
+
+
 # ---------------------------------------------------------------------------
 # Merging
 # ---------------------------------------------------------------------------
@@ -1372,6 +1733,10 @@ def merge_nodes(best_id_groups, nodes_by_id):
         for n in group_nodes:
             all_years.update(n.get("years", []))
         max_domain_count = max((n.get("domain_count", 0) for n in group_nodes), default=0)
+        # Documents naming any alias; an upper bound when aliases share documents.
+        # None (unknown) for networks extracted before doc_freq was recorded.
+        doc_freqs = [n.get("doc_freq") for n in group_nodes if n.get("doc_freq") is not None]
+        total_doc_freq = sum(doc_freqs) if doc_freqs else None
 
         domain = normalize_domain(best_node.get("domain", ""))
         final_name = name or best_node.get("name", "")
@@ -1396,6 +1761,7 @@ def merge_nodes(best_id_groups, nodes_by_id):
             "count": total_count,
             "years": sorted(all_years),
             "domain_count": max_domain_count,
+            "doc_freq": total_doc_freq,
             "aliases": all_aliases,
         }
         merged_nodes.append(merged)
@@ -1403,44 +1769,149 @@ def merge_nodes(best_id_groups, nodes_by_id):
     return merged_nodes
 
 
+def _add_edge(edge_agg, edge, alias_map):
+    """Remap one edge through the alias map and fold it into edge_agg."""
+    src = alias_map.get(edge["source"], edge["source"])
+    tgt = alias_map.get(edge["target"], edge["target"])
+
+    # Skip self-loops created by merging
+    if src == tgt:
+        return
+
+    # Normalize edge key (unidirectional - preserve source->target direction)
+    key = (src, tgt)
+
+    if key in edge_agg:
+        agg = edge_agg[key]
+        agg["weight"] += edge.get("weight", 1)
+        agg["years"] = merge_sorted_unique(agg["years"], edge.get("years", []))
+        agg["doc_ids"] = merge_sorted_unique(agg["doc_ids"], edge.get("doc_ids", []))
+    else:
+        edge_agg[key] = {
+            "source": src,
+            "target": tgt,
+            "weight": edge.get("weight", 1),
+            "years": list(edge.get("years", [])),
+            "doc_ids": list(edge.get("doc_ids", [])),
+        }
+
+
 def merge_edges(edges, alias_map):
-    """Remap edge endpoints through alias map and merge duplicate edges."""
+    """Remap edge endpoints through alias map and merge duplicate edges.
+
+    edges may be any iterable, including a stream from iter_network_items.
+    Edge years and doc_ids are expected sorted and duplicate-free (as written
+    by export_to_json and by this script), so they are merged as sorted lists
+    rather than held in sets.
+    """
     edge_agg = {}
     for edge in edges:
-        src = alias_map.get(edge["source"], edge["source"])
-        tgt = alias_map.get(edge["target"], edge["target"])
+        _add_edge(edge_agg, edge, alias_map)
+    return list(edge_agg.values())
+
+
+# ---------------------------------------------------------------------------
+# External-Sort Edge Merge
+# ---------------------------------------------------------------------------
+
+EXTERNAL_RUN_SIZE = 200000   # distinct edges buffered before spilling a sorted run
+EXTERNAL_MAX_FANIN = 128     # max run files open at once during the k-way merge
+
 
-        # Skip self-loops created by merging
-        if src == tgt:
+def _edge_records(edge_agg):
+    """Sorted [src, tgt, weight, years, doc_ids] records for an edge aggregate."""
+    for (src, tgt), e in sorted(edge_agg.items()):
+        yield [src, tgt, e["weight"], e["years"], e["doc_ids"]]
+
+
+def _write_edge_run(records, path):
+    """Write sorted edge records to a run file, one JSON array per line."""
+    with open(path, 'w') as f:
+        for record in records:
+            f.write(_COMPACT_JSON.encode(record))
+            f.write('\n')
+
+
+def _read_edge_run(path):
+    with open(path, 'r') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _merge_edge_runs(run_paths):
+    """K-way merge sorted run files, combining records with the same endpoints."""
+    readers = [_read_edge_run(p) for p in run_paths]
+    current = None
+    for record in heapq.merge(*readers, key=lambda r: (r[0], r[1])):
+        if current is not None and record[0] == current[0] and record[1] == current[1]:
+            current[2] += record[2]
+            current[3] = merge_sorted_unique(current[3], record[3])
+            current[4] = merge_sorted_unique(current[4], record[4])
             continue
+        if current is not None:
+            yield current
+        current = record
+    if current is not None:
+        yield current
+
+
+def merge_edges_external(edges, alias_map, spill_dir=None, run_size=EXTERNAL_RUN_SIZE):
+    """Disk-backed merge_edges for networks whose edges do not fit in RAM.
 
-        # Normalize edge key (unidirectional - preserve source->target direction)
-        key = (src, tgt)
+    Remapped edges are aggregated in batches of at most run_size distinct
+    (source, target) keys, each batch is spilled to a sorted run file under
+    spill_dir (default: system temp dir), and the runs are k-way merged.
 
-        if key in edge_agg:
-            edge_agg[key]["weight"] += edge.get("weight", 1)
-            edge_agg[key]["years"].update(edge.get("years", []))
-            edge_agg[key]["doc_ids"].update(edge.get("doc_ids", []))
+    Yields merged edges in (source, target) order, so output is deterministic.
+    All input edges are consumed before the first merged edge is yielded.
+    """
+    with tempfile.TemporaryDirectory(prefix="dedup-runs-", dir=spill_dir) as run_dir:
+        run_paths = []
+        runs_written = 0
+
+        def spill(records):
+            nonlocal runs_written
+            path = os.path.join(run_dir, f"run-{runs_written:06d}.jsonl")
+            runs_written += 1
+            _write_edge_run(records, path)
+            run_paths.append(path)
+
+        edge_agg = {}
+        for edge in edges:
+            _add_edge(edge_agg, edge, alias_map)
+            if len(edge_agg) >= run_size:
+                spill(_edge_records(edge_agg))
+                edge_agg.clear()
+
+        if run_paths:
+            if edge_agg:
+                spill(_edge_records(edge_agg))
+                edge_agg.clear()
+            print(f"  Spilled edges to {len(run_paths)} sorted runs")
+
+            # Reduce fan-in with intermediate merge passes if there are many runs
+            while len(run_paths) > EXTERNAL_MAX_FANIN:
+                batch = run_paths[:EXTERNAL_MAX_FANIN]
+                del run_paths[:EXTERNAL_MAX_FANIN]
+                spill(_merge_edge_runs(batch))
+                for path in batch:
+                    os.remove(path)
+            records = _merge_edge_runs(run_paths)
         else:
-            edge_agg[key] = {
+            # Everything fit in one batch; no need to touch disk
+            records = _edge_records(edge_agg)
+
+        for src, tgt, weight, years, doc_ids in records:
+            yield {
                 "source": src,
                 "target": tgt,
-                "weight": edge.get("weight", 1),
-                "years": set(edge.get("years", [])),
-                "doc_ids": set(edge.get("doc_ids", [])),
+                "weight": weight,
+                "years": years,
+                "doc_ids": doc_ids,
             }
 
-    # Convert sets back to sorted lists
-    merged_edges = []
-    for e in edge_agg.values():
-        e["years"] = sorted(e["years"])
-        e["doc_ids"] = sorted(e["doc_ids"])
-        merged_edges.append(e)
 
-    return merged_edges
-
-
-def recompute_stats(nodes, edges):
+def recompute_stats(nodes, edge_count):
     """Recompute top-level stats from merged data."""
     domain_counts = defaultdict(int)
     for node in nodes:
@@ -1452,11 +1923,38 @@ def recompute_stats(nodes, edges):
 
     return {
         "nodes": len(nodes),
-        "edges": len(edges),
+        "edges": edge_count,
         "top_domains": [{"domain": d, "count": c} for d, c in top_domains],
     }
 
 
+def write_network(path, nodes, edges):
+    """Write a network file, streaming edges one at a time. Returns the stats.
+
+    edges may be a generator (e.g. merge_edges_external); stats are computed
+    from what was written and placed after the edges. The file is written
+    under a temporary name and renamed into place, so path may be the same
+    file the edges are being streamed from.
+    """
+    tmp_path = path + ".tmp"
+    edge_count = 0
+    with open(tmp_path, 'w') as f:
+        f.write('{"nodes":')
+        json.dump(nodes, f, separators=(',', ':'))
+        f.write(',"edges":[')
+        for edge in edges:
+            if edge_count:
+                f.write(',')
+            f.write(_COMPACT_JSON.encode(edge))
+            edge_count += 1
+        stats = recompute_stats(nodes, edge_count)
+        f.write('],"stats":')
+        f.write(_COMPACT_JSON.encode(stats))
+        f.write('}')
+    os.replace(tmp_path, path)
+    return stats
+
+
 # ---------------------------------------------------------------------------
 # Main Pipeline
 # ---------------------------------------------------------------------------
@@ -1535,12 +2033,15 @@ def _same_name_merge(alias_map, nodes_by_id):
         count = _total_count_for_canonical(canon, canonical_to_originals, nodes_by_id)
         local_domain_groups[local].append((canon, domain, count))
 
+    prof = _PROFILER
     uf1b = _UnionFind()
     for local, entries in local_domain_groups.items():
         if len(entries) < 2:
             continue
         for canon, domain, count in entries:
             uf1b.add(canon, count)
+        if prof is not None:
+            prof.count("candidate_pairs", len(entries) * (len(entries) - 1) // 2)
         for i in range(len(entries)):
             ci, di, cnti = entries[i]
             for j in range(i + 1, len(entries)):
@@ -1599,6 +2100,8 @@ def _same_name_merge(alias_map, nodes_by_id):
 
         for canon, domain, count in entries:
             uf2.add(canon, count)
+        if prof is not None:
+            prof.count("candidate_pairs", len(entries) * (len(entries) - 1) // 2)
 
         # Pairwise comparison within each group
         for i in range(len(entries)):
@@ -1642,6 +2145,8 @@ def _same_name_merge(alias_map, nodes_by_id):
             continue
         for canon, local, domain, count, parts, is_generic in entries:
             uf2.add(canon, count)
+        if prof is not None:
+            prof.count("candidate_pairs", len(entries) * (len(entries) - 1) // 2)
 
         for i in range(len(entries)):
             ci, li, di, cnti, pi, gi = entries[i]
@@ -1729,14 +2234,24 @@ def _apply_layer_merges(alias_map, merges):
     return changes
 
 
-def build_alias_map(nodes, no_fuzzy=False, report=False):
+def build_alias_map(nodes, no_fuzzy=False, report=False, profile=None):
     """Build complete alias map through all dedup layers.
 
+    nodes: list of node dicts, or a dict of id -> node (e.g. from load_nodes)
+    profile: optional DedupProfiler to record per-layer timings and counters
+
     Returns:
         final_remap: dict mapping original node ID -> best original ID
         best_id_groups: dict mapping best original ID -> set of all original IDs
     """
-    nodes_by_id = {n["id"]: n for n in nodes}
+    if profile is not None:
+        with profiling(profile):
+            return build_alias_map(nodes, no_fuzzy=no_fuzzy, report=report)
+
+    if isinstance(nodes, dict):
+        nodes_by_id = nodes
+    else:
+        nodes_by_id = {n["id"]: n for n in nodes}
     all_original_ids = set(nodes_by_id.keys())
 
     # alias_map: original_id -> normalized canonical (for grouping only)
@@ -1745,64 +2260,85 @@ def build_alias_map(nodes, no_fuzzy=False, report=False):
     layer_stats = []
 
     # --- Layer 1: Structural Cleanup ---
-    changes = 0
-    for nid in list(alias_map.keys()):
-        cleaned = structural_cleanup(nid)
-        if cleaned != nid:
-            alias_map[nid] = cleaned
-            changes += 1
-    layer_stats.append(("Layer 1: Structural Cleanup", changes))
+    with _profile_layer("Layer 1: Structural Cleanup"):
+        prior = set(alias_map.values()) if _PROFILER is not None else None
+        changed = []
+        for nid in list(alias_map.keys()):
+            cleaned = structural_cleanup(nid)
+            if cleaned != nid:
+                alias_map[nid] = cleaned
+                changed.append((nid, cleaned))
+        _profile_rewrites(changed, prior)
+    layer_stats.append(("Layer 1: Structural Cleanup", len(changed)))
 
     # --- Layer 2: Domain Normalization ---
-    changes = 0
-    for nid in list(alias_map.keys()):
-        current = alias_map[nid]
-        normalized = apply_domain_normalization(current)
-        if normalized != current:
-            alias_map[nid] = normalized
-            changes += 1
-    layer_stats.append(("Layer 2: Domain Normalization", changes))
+    with _profile_layer("Layer 2: Domain Normalization"):
+        prior = set(alias_map.values()) if _PROFILER is not None else None
+        changed = []
+        for nid in list(alias_map.keys()):
+            current = alias_map[nid]
+            normalized = apply_domain_normalization(current)
+            if normalized != current:
+                alias_map[nid] = normalized
+                changed.append((current, normalized))
+        _profile_rewrites(changed, prior)
+    layer_stats.append(("Layer 2: Domain Normalization", len(changed)))
 
     # --- Layer 3: Local-Part OCR Normalization ---
-    changes = 0
-    for nid in list(alias_map.keys()):
-        current = alias_map[nid]
-        ocr_fixed = apply_local_ocr_normalization(current)
-        if ocr_fixed != current:
-            alias_map[nid] = ocr_fixed
-            changes += 1
-    layer_stats.append(("Layer 3: Local-Part OCR Normalization", changes))
+    with _profile_layer("Layer 3: Local-Part OCR Normalization"):
+        prior = set(alias_map.values()) if _PROFILER is not None else None
+        changed = []
+        for nid in list(alias_map.keys()):
+            current = alias_map[nid]
+            ocr_fixed = apply_local_ocr_normalization(current)
+            if ocr_fixed != current:
+                alias_map[nid] = ocr_fixed
+                changed.append((current, ocr_fixed))
+        _profile_rewrites(changed, prior)
+    layer_stats.append(("Layer 3: Local-Part OCR Normalization", len(changed)))
 
     # --- Layer 3b: Join Split Local Parts ---
-    join_merges = join_split_local_matches(alias_map, all_original_ids)
-    changes = _apply_layer_merges(alias_map, join_merges)
+    with _profile_layer("Layer 3b: Join Split Locals"):
+        join_merges = join_split_local_matches(alias_map, all_original_ids)
+        changes = _apply_layer_merges(alias_map, join_merges)
+        _profile_merges(join_merges)
     layer_stats.append(("Layer 3b: Join Split Locals", changes))
 
     # --- Layer 3c: Prefix Stripping ---
-    prefix_merges = prefix_strip_matches(alias_map)
-    changes = _apply_layer_merges(alias_map, prefix_merges)
+    with _profile_layer("Layer 3c: Prefix Stripping"):
+        prefix_merges = prefix_strip_matches(alias_map)
+        changes = _apply_layer_merges(alias_map, prefix_merges)
+        _profile_merges(prefix_merges)
     layer_stats.append(("Layer 3c: Prefix Stripping", changes))
 
     # --- Layer 4: Fuzzy Edit-Distance Matching ---
-    fuzzy_merges = fuzzy_match_groups(nodes_by_id, alias_map, skip=no_fuzzy)
-    changes = _apply_layer_merges(alias_map, fuzzy_merges)
+    with _profile_layer("Layer 4: Fuzzy Edit-Distance"):
+        fuzzy_merges = fuzzy_match_groups(nodes_by_id, alias_map, skip=no_fuzzy)
+        changes = _apply_layer_merges(alias_map, fuzzy_merges)
+        _profile_merges(fuzzy_merges)
     layer_stats.append(("Layer 4: Fuzzy Edit-Distance", changes))
 
     # --- Layer 5: Single-Part to Full-Name Matching ---
-    single_merges = single_to_full_name_matches(alias_map, nodes_by_id)
-    changes = _apply_layer_merges(alias_map, single_merges)
+    with _profile_layer("Layer 5: Single-Part to Full-Name"):
+        single_merges = single_to_full_name_matches(alias_map, nodes_by_id)
+        changes = _apply_layer_merges(alias_map, single_merges)
+        _profile_merges(single_merges)
     layer_stats.append(("Layer 5: Single-Part to Full-Name", changes))
 
     # --- Layer 6: Concatenation Matching ---
-    concat_merges = concatenation_matches(alias_map, nodes_by_id)
-    changes = _apply_layer_merges(alias_map, concat_merges)
+    with _profile_layer("Layer 6: Concatenation Matching"):
+        concat_merges = concatenation_matches(alias_map, nodes_by_id)
+        changes = _apply_layer_merges(alias_map, concat_merges)
+        _profile_merges(concat_merges)
     layer_stats.append(("Layer 6: Concatenation Matching", changes))
 
     # --- Layer 7: Same-Name Merging ---
     # Merge nodes with identical display names within the same domain.
     # Final safety net for duplicates that slipped through earlier layers.
-    same_name_merges = _same_name_merge(alias_map, nodes_by_id)
-    changes = _apply_layer_merges(alias_map, same_name_merges)
+    with _profile_layer("Layer 7: Same-Name Merge"):
+        same_name_merges = _same_name_merge(alias_map, nodes_by_id)
+        changes = _apply_layer_merges(alias_map, same_name_merges)
+        _profile_merges(same_name_merges)
     layer_stats.append(("Layer 7: Same-Name Merge", changes))
 
     # Print layer stats
@@ -1862,39 +2398,59 @@ def build_alias_map(nodes, no_fuzzy=False, report=False):
     return final_remap, best_id_groups
 
 
-def run_dedup(input_path, output_path=None, dry_run=False, report=False, no_fuzzy=False):
-    """Main deduplication pipeline."""
-    print(f"Loading {input_path}...")
-    with open(input_path, 'r') as f:
-        data = json.load(f)
-
-    nodes = data["nodes"]
-    edges = data["edges"]
-    orig_stats = data.get("stats", {})
-
-    print(f"Original: {len(nodes)} nodes, {len(edges)} edges")
-
-    orig_total_count = sum(n.get("count", 0) for n in nodes)
-    print(f"Total count (sum of all node counts): {orig_total_count}")
-
-    # Build alias map (original -> best original ID)
-    final_remap, best_id_groups = build_alias_map(
-        nodes, no_fuzzy=no_fuzzy, report=report
-    )
+def write_deduped(nodes_by_id, final_remap, best_id_groups, edges, output_path,
+                  external_sort=False, spill_dir=None, run_size=EXTERNAL_RUN_SIZE):
+    """Merge nodes and edges through a built alias map and write the result.
 
-    if dry_run:
-        print("\n[DRY RUN] No files written.")
-        return
+    nodes_by_id and edges are the pre-dedup network (edges may be a stream);
+    final_remap and best_id_groups come from build_alias_map. Prints the
+    invariant checks and reduction summary. Returns the written stats.
+    """
+    orig_total_count = sum(n.get("count", 0) for n in nodes_by_id.values())
 
     # Merge nodes
-    nodes_by_id = {n["id"]: n for n in nodes}
     merged_nodes = merge_nodes(best_id_groups, nodes_by_id)
+    node_ids = {n["id"] for n in merged_nodes}
+
+    # Stream edges through the merge, counting originals as they pass
+    orig_edge_count = 0
+
+    def stream_edges():
+        nonlocal orig_edge_count
+        for edge in edges:
+            orig_edge_count += 1
+            yield edge
 
     # Merge edges (remap original IDs -> best original IDs)
-    merged_edges = merge_edges(edges, final_remap)
+    if external_sort:
+        print("Merging edges with external sort...")
+        merged_edges = merge_edges_external(
+            stream_edges(), final_remap, spill_dir=spill_dir, run_size=run_size
+        )
+    else:
+        merged_edges = merge_edges(stream_edges(), final_remap)
+
+    # Edge invariants are tallied as edges are written, since in external
+    # sort mode merged_edges is a one-shot generator
+    bad_endpoints = 0
+    self_loops = 0
+
+    def checked_edges():
+        nonlocal bad_endpoints, self_loops
+        for e in merged_edges:
+            if e["source"] not in node_ids:
+                bad_endpoints += 1
+            if e["target"] not in node_ids:
+                bad_endpoints += 1
+            if e["source"] == e["target"]:
+                self_loops += 1
+            yield e
 
-    # Recompute stats
-    new_stats = recompute_stats(merged_nodes, merged_edges)
+    # Write output
+    print(f"Writing {output_path}...")
+    new_stats = write_network(output_path, merged_nodes, checked_edges())
+    merged_edge_count = new_stats["edges"]
+    print(f"Original edges: {orig_edge_count}")
 
     # --- Invariant checks ---
     new_total_count = sum(n.get("count", 0) for n in merged_nodes)
@@ -1908,20 +2464,12 @@ def run_dedup(input_path, output_path=None, dry_run=False, report=False, no_fuzz
         print(f"  Total count conserved: {new_total_count}")
 
     # Check all edge endpoints exist
-    node_ids = {n["id"] for n in merged_nodes}
-    bad_endpoints = 0
-    for e in merged_edges:
-        if e["source"] not in node_ids:
-            bad_endpoints += 1
-        if e["target"] not in node_ids:
-            bad_endpoints += 1
     if bad_endpoints:
         print(f"  WARNING: {bad_endpoints} edge endpoints reference non-existent nodes")
     else:
         print(f"  All edge endpoints valid")
 
     # Check no self-loops
-    self_loops = sum(1 for e in merged_edges if e["source"] == e["target"])
     if self_loops:
         print(f"  WARNING: {self_loops} self-loops found")
     else:
@@ -1933,12 +2481,51 @@ def run_dedup(input_path, output_path=None, dry_run=False, report=False, no_fuzz
     else:
         print(f"  No duplicate node IDs")
 
-    # Build output
-    output_data = {
-        "stats": new_stats,
-        "nodes": merged_nodes,
-        "edges": merged_edges,
-    }
+    print(f"\nDone! {len(merged_nodes)} nodes, {merged_edge_count} edges")
+    print(f"Reduction: {len(nodes_by_id) - len(merged_nodes)} nodes removed "
+          f"({(len(nodes_by_id) - len(merged_nodes)) / max(1, len(nodes_by_id)) * 100:.1f}%)")
+    print(f"           {orig_edge_count - merged_edge_count} edges removed "
+          f"({(orig_edge_count - merged_edge_count) / max(1, orig_edge_count) * 100:.1f}%)")
+
+    return new_stats
+
+
+def run_dedup(input_path, output_path=None, dry_run=False, report=False, no_fuzzy=False,
+              external_sort=False, spill_dir=None, run_size=EXTERNAL_RUN_SIZE,
+              profile_path=None):
+    """Main deduplication pipeline.
+
+    Nodes are loaded into CompactNode records; edges are streamed from the
+    input file straight into merge_edges and never held as a raw list.
+    With external_sort, edges are merged through sorted run files on disk
+    (see merge_edges_external) and written in (source, target) order.
+    With profile_path, per-layer timings and comparison counters are written
+    there as JSON.
+    """
+    print(f"Loading {input_path}...")
+    nodes_by_id = load_nodes(input_path)
+
+    print(f"Original: {len(nodes_by_id)} nodes")
+
+    orig_total_count = sum(n.get("count", 0) for n in nodes_by_id.values())
+    print(f"Total count (sum of all node counts): {orig_total_count}")
+
+    # Build alias map (original -> best original ID)
+    profiler = DedupProfiler() if profile_path else None
+    final_remap, best_id_groups = build_alias_map(
+        nodes_by_id, no_fuzzy=no_fuzzy, report=report, profile=profiler
+    )
+
+    if profiler is not None:
+        profiler.print_summary()
+        profiler.write(profile_path, input=input_path, nodes=len(nodes_by_id),
+                       unique_nodes=len(best_id_groups), no_fuzzy=no_fuzzy,
+                       distance_backend=DISTANCE_BACKEND)
+        print(f"  Profile written to {profile_path}")
+
+    if dry_run:
+        print("\n[DRY RUN] No files written.")
+        return
 
     # Determine output path
     if output_path is None:
@@ -1950,16 +2537,11 @@ def run_dedup(input_path, output_path=None, dry_run=False, report=False, no_fuzz
         print(f"\nBacking up to {backup_path}...")
         shutil.copy2(input_path, backup_path)
 
-    # Write output
-    print(f"Writing {output_path}...")
-    with open(output_path, 'w') as f:
-        json.dump(output_data, f, separators=(',', ':'))
-
-    print(f"\nDone! {len(merged_nodes)} nodes, {len(merged_edges)} edges")
-    print(f"Reduction: {len(nodes) - len(merged_nodes)} nodes removed "
-          f"({(len(nodes) - len(merged_nodes)) / len(nodes) * 100:.1f}%)")
-    print(f"           {len(edges) - len(merged_edges)} edges removed "
-          f"({(len(edges) - len(merged_edges)) / len(edges) * 100:.1f}%)")
+    write_deduped(
+        nodes_by_id, final_remap, best_id_groups,
+        iter_network_items(input_path, "edges"), output_path,
+        external_sort=external_sort, spill_dir=spill_dir, run_size=run_size,
+    )
 
 
 def main():
@@ -1986,19 +2568,75 @@ def main():
         "--no-fuzzy", action="store_true",
         help="Skip Layer 4 (fuzzy edit-distance matching)"
     )
+    parser.add_argument(
+        "--backend", default="auto", choices=["auto", "python", "rapidfuzz"],
+        help="Distance function backend (default: auto, rapidfuzz when installed)"
+    )
+    parser.add_argument(
+        "--check-backend", action="store_true",
+        help="Check every available distance backend against the stdlib scores and exit"
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Write per-layer timings and distance-call counters as JSON"
+    )
+    parser.add_argument(
+        "--profile-output", default=DEFAULT_PROFILE_OUTPUT, metavar="PATH",
+        help=f"Profile report path (default: {DEFAULT_PROFILE_OUTPUT})"
+    )
+    parser.add_argument(
+        "--external-sort", action="store_true",
+        help="Merge edges through sorted run files on disk (bounded memory, sorted output)"
+    )
+    parser.add_argument(
+        "--spill-dir", default=None,
+        help="Directory for external sort run files (default: system temp dir)"
+    )
+    parser.add_argument(
+        "--run-size", type=int, default=EXTERNAL_RUN_SIZE,
+        help=f"Distinct edges per sorted run (default: {EXTERNAL_RUN_SIZE})"
+    )
 
     args = parser.parse_args()
 
+    if args.check_backend:
+        failed = False
+        for name, bad in check_backend_parity().items():
+            status = "OK" if not bad else f"{len(bad)} mismatches"
+            print(f"  {name}: {status}")
+            for func, a, b in bad[:10]:
+                print(f"    {func}({a!r}, {b!r})")
+            failed = failed or bool(bad)
+        sys.exit(1 if failed else 0)
+
+    try:
+        backend = set_distance_backend(args.backend)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Distance backend: {backend}")
+
     if not os.path.exists(args.input):
         print(f"Error: {args.input} not found", file=sys.stderr)
         sys.exit(1)
 
+    if args.profile:
+        report_path = os.path.realpath(args.profile_output)
+        for path in (args.input, args.output):
+            if path and os.path.realpath(path) == report_path:
+                print(f"Error: --profile-output would overwrite {path}", file=sys.stderr)
+                sys.exit(1)
+
     run_dedup(
         input_path=args.input,
         output_path=args.output,
         dry_run=args.dry_run,
         report=args.report,
         no_fuzzy=args.no_fuzzy,
+        external_sort=args.external_sort,
+        spill_dir=args.spill_dir,
+        run_size=args.run_size,
+        profile_path=args.profile_output if args.profile else None,
     )
 
 
@@ -9,11 +9,14 @@ import json
 import argparse
 import os
 from collections import defaultdict
-from pymongo import MongoClient
+from pymongo import ASCENDING, MongoClient, UpdateOne
 
 # Email regex - requires at least 2 chars before @
 EMAIL_REGEX = re.compile(r'[a-zA-Z0-9][a-zA-Z0-9._-]+@[a-zA-Z0-9.-]+\.(com|net|org|edu|gov|mil|co|io|me|info|biz)', re.IGNORECASE)
 
+# Derived per-document field holding canonical From/To/CC addresses
+EMAILS_FIELD = 'emails'
+
 # Patterns for extracting From/To/CC
 FROM_PATTERNS = [
     re.compile(r'From:\s*([^<\n]*?)\s*<?([a-zA-Z0-9][a-zA-Z0-9._-]+@[a-zA-Z0-9.-]+\.[a-z]{2,})>?', re.IGNORECASE),
@@ -369,6 +372,62 @@ def parse_email_document(text):
     return result
 
 
+def document_emails(parsed):
+    """Canonical addresses for a document's `emails` field.
+
+    Takes parse_email_document output; every From/To/CC address is stored in
+    canonicalize_email form so reversed local parts share one key.
+    """
+    if not parsed:
+        return []
+    return sorted({canonicalize_email(e) for e in parsed['from'] | parsed['to'] | parsed['cc']})
+
+
+def email_query_keys(addresses):
+    """Map raw addresses or network aliases to their `emails` field keys."""
+    return sorted({canonicalize_email(normalize_email(a.strip().lower()))
+                   for a in addresses if '@' in a})
+
+
+def index_document_emails(collection, max_docs=None, batch_size=1000):
+    """Store the `emails` field on every email document and index it.
+
+    Documents the parser finds no addresses in are left without the field.
+    Re-run after ingesting new documents. Returns the number of documents
+    updated.
+    """
+    query = {
+        '$and': [
+            {'text': {'$regex': r'From:.*@', '$options': 'i'}},
+            {'text': {'$regex': r'To:.*@', '$options': 'i'}}
+        ]
+    }
+    cursor = collection.find(query, {'text': 1})
+    if max_docs:
+        cursor = cursor.limit(max_docs)
+
+    print(f"Indexing document emails in {collection.name}...")
+    updated = 0
+    batch = []
+    for doc in cursor:
+        emails = document_emails(parse_email_document(doc.get('text', '')))
+        if not emails:
+            continue
+        batch.append(UpdateOne({'_id': doc['_id']}, {'$set': {EMAILS_FIELD: emails}}))
+        if len(batch) >= batch_size:
+            collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+            print(f"  Updated {updated} documents...")
+    if batch:
+        collection.bulk_write(batch, ordered=False)
+        updated += len(batch)
+
+    collection.create_index([(EMAILS_FIELD, ASCENDING)])
+    print(f"  Updated {updated} documents, index on '{EMAILS_FIELD}' ready")
+    return updated
+
+
 def build_email_network(db, max_docs=None):
     """Build email correspondence network from MongoDB documents."""
 
@@ -385,7 +444,7 @@ def build_email_network(db, max_docs=None):
         cursor = cursor.limit(max_docs)
 
     # Track nodes (email addresses) and edges (correspondence)
-    nodes = {}  # email -> {count, sent_count, received_count, domains, years}
+    nodes = {}  # email -> {count, sent_count, received_count, doc_freq, domains, years}
     edges = defaultdict(lambda: {'weight': 0, 'years': set(), 'doc_ids': set()})  # (from, to) -> {weight, years, doc_ids}
     display_names = {}  # email -> display name (best one found)
 
@@ -427,6 +486,7 @@ def build_email_network(db, max_docs=None):
                 nodes[email] = {
                     'sent_count': 0,
                     'received_count': 0,
+                    'doc_freq': 0,
                     'years': set(),
                     'domains_sent_to': set()
                 }
@@ -441,6 +501,7 @@ def build_email_network(db, max_docs=None):
                 nodes[email] = {
                     'sent_count': 0,
                     'received_count': 0,
+                    'doc_freq': 0,
                     'years': set(),
                     'domains_sent_to': set()
                 }
@@ -448,6 +509,10 @@ def build_email_network(db, max_docs=None):
             if year:
                 nodes[email]['years'].add(year)
 
+        # Document frequency: documents each address appears in
+        for email in from_emails | to_emails:
+            nodes[email]['doc_freq'] += 1
+
         # Create edges (from -> to)
         for from_email in from_emails:
             for to_email in to_emails:
@@ -469,8 +534,8 @@ def build_email_network(db, max_docs=None):
     return nodes, edges, display_names
 
 
-def export_to_json(nodes, edges, display_names, output_file, min_count=1, min_weight=1):
-    """Export network to D3.js-compatible JSON."""
+def build_network_output(nodes, edges, display_names, min_count=1, min_weight=1):
+    """Consolidate, filter and shape the network into a D3.js-compatible dict."""
 
     # Step 1: Build alias map to consolidate duplicates (e.g., pruitt.scott -> scott.pruitt)
     print("Consolidating duplicate email addresses...")
@@ -489,12 +554,14 @@ def export_to_json(nodes, edges, display_names, output_file, min_count=1, min_we
             merged_nodes[canonical] = {
                 'sent_count': 0,
                 'received_count': 0,
+                'doc_freq': 0,
                 'years': set(),
                 'domains_sent_to': set(),
                 'aliases': set()
             }
         merged_nodes[canonical]['sent_count'] += data['sent_count']
         merged_nodes[canonical]['received_count'] += data['received_count']
+        merged_nodes[canonical]['doc_freq'] += data.get('doc_freq', 0)
         merged_nodes[canonical]['years'].update(data['years'])
         merged_nodes[canonical]['domains_sent_to'].update(data['domains_sent_to'])
         if email != canonical:
@@ -540,7 +607,8 @@ def export_to_json(nodes, edges, display_names, output_file, min_count=1, min_we
             'received': data['received_count'],
             'count': data['sent_count'] + data['received_count'],
             'years': sorted(list(data['years'])),
-            'domain_count': len(data['domains_sent_to'])
+            'domain_count': len(data['domains_sent_to']),
+            'doc_freq': data['doc_freq']
         })
         node_ids.add(email)
 
@@ -567,7 +635,7 @@ def export_to_json(nodes, edges, display_names, output_file, min_count=1, min_we
     top_domains = sorted(domains.items(), key=lambda x: x[1], reverse=True)[:50]
 
     # Build output
-    output = {
+    return {
         'stats': {
             'nodes': len(node_list),
             'edges': len(edge_list),
@@ -577,9 +645,14 @@ def export_to_json(nodes, edges, display_names, output_file, min_count=1, min_we
         'edges': edge_list
     }
 
+
+def export_to_json(nodes, edges, display_names, output_file, min_count=1, min_weight=1):
+    """Export network to D3.js-compatible JSON."""
+    output = build_network_output(nodes, edges, display_names, min_count, min_weight)
+
     print(f"\nExporting to {output_file}...")
-    print(f"  Nodes (min_count={min_count}): {len(node_list)}")
-    print(f"  Edges (min_weight={min_weight}): {len(edge_list)}")
+    print(f"  Nodes (min_count={min_count}): {len(output['nodes'])}")
+    print(f"  Edges (min_weight={min_weight}): {len(output['edges'])}")
 
     with open(output_file, 'w') as f:
         json.dump(output, f)
@@ -599,6 +672,10 @@ def main():
     parser.add_argument('--max-docs', type=int, help='Maximum documents to process')
     parser.add_argument('--min-count', type=int, default=1, help='Minimum email activity to include node')
     parser.add_argument('--min-weight', type=int, default=1, help='Minimum edge weight to include')
+    parser.add_argument('--index-emails', action='store_true',
+                        help=f"Store canonical addresses in each document's '{EMAILS_FIELD}' field and index it")
+    parser.add_argument('--collection', default='documents',
+                        help='Collection to add the emails field to (with --index-emails)')
 
     args = parser.parse_args()
 
@@ -607,6 +684,9 @@ def main():
     client = MongoClient(args.mongo_uri)
     db = client[args.db]
 
+    if args.index_emails:
+        index_document_emails(db[args.collection], args.max_docs)
+
     # Build network
     nodes, edges, display_names = build_email_network(db, args.max_docs)
 
@@ -4,12 +4,18 @@ download their PDFs from CDN, zip them, upload to S3,
 and return a presigned download URL.
 
 Usage: fetch_correspondence.py <json-file>
+       fetch_correspondence.py --worker
   The JSON file should contain: {"email1": "...", "email2": "...", "name1": "...", "name2": "..."}
+  (plus optional "aliases1"/"aliases2" lists). With "mode": "manifest" no zip
+  is built: the response lists each document's CDN URL and year instead.
+
+  --worker keeps the process alive: it reads one such JSON request per line
+  on stdin and writes one JSON response per line on stdout, echoing the
+  request's "id". Mongo and S3 clients stay connected between requests.
 """
 
 import sys
 import os
-import re
 import json
 import time
 import tempfile
@@ -21,6 +27,10 @@ import boto3
 from botocore.exceptions import ClientError
 from pymongo import MongoClient
 
+from alias_regex import build_aliases_regex, build_email_regex
+from extract_emails import EMAILS_FIELD, email_query_keys
+from pdf_cache import PdfCache
+
 DOWNLOAD_DELAY = 0.05  # seconds between CDN requests
 S3_BUCKET = "edgizips"
 S3_PREFIX = "correspondence"
@@ -30,47 +40,59 @@ MAX_DOCS = 500  # safety cap
 CDN_BASE = "https://cdn.toxicdocs.org"
 MONGO_URI = "mongodb://localhost:27017"
 MONGO_DB = "edgifoia"
+INDEX_CHECK_INTERVAL = 300  # seconds a worker trusts its last `emails` index check
 
 
-def log(msg):
-    print(msg, file=sys.stderr, flush=True)
+_clients = {}
 
 
-def build_pdf_url(hash_id):
-    prefix = hash_id[:2]
-    return f"{CDN_BASE}/{prefix}/{hash_id}/{hash_id}.pdf"
+def get_db():
+    if "mongo" not in _clients:
+        _clients["mongo"] = MongoClient(MONGO_URI)
+    return _clients["mongo"][MONGO_DB]
 
 
-def build_email_regex(email):
-    """Build a regex that matches this email with OCR domain variants.
+def get_s3():
+    if "s3" not in _clients:
+        _clients["s3"] = boto3.client('s3')
+    return _clients["s3"]
 
-    For example, bennett.tate@epa.gov matches:
-      bennett.tate@epa.gov
-      bennett.tate@epa.govl
-      bennett.tate@epamail.epa.gov
-    """
-    local, domain = email.split('@', 1)
-    local_escaped = re.escape(local)
 
-    # Use base domain (last two parts) to be flexible with subdomains/OCR
-    domain_parts = domain.split('.')
-    if len(domain_parts) >= 2:
-        base = '.'.join(domain_parts[-2:])
-    else:
-        base = domain
-    base_escaped = re.escape(base)
+_emails_index = {"checked": float("-inf"), "present": False}
 
-    return f'{local_escaped}@[a-zA-Z0-9._-]*{base_escaped}'
 
+def has_emails_index(coll):
+    """Whether the documents carry an indexed `emails` field (re-checked periodically)."""
+    now = time.monotonic()
+    if now - _emails_index["checked"] > INDEX_CHECK_INTERVAL:
+        indexes = coll.index_information()
+        _emails_index["present"] = any(
+            spec['key'][0][0] == EMAILS_FIELD for spec in indexes.values())
+        _emails_index["checked"] = now
+    return _emails_index["present"]
 
-def build_aliases_regex(aliases):
-    """Build a single regex that matches any of the email aliases."""
-    if not aliases:
-        return None
-    patterns = [build_email_regex(a) for a in aliases if '@' in a]
-    if len(patterns) == 1:
-        return patterns[0]
-    return '(?:' + '|'.join(patterns) + ')'
+
+def get_pdf_cache():
+    if "pdf_cache" not in _clients:
+        _clients["pdf_cache"] = PdfCache(log=log)
+    return _clients["pdf_cache"]
+
+
+def log(msg):
+    print(msg, file=sys.stderr, flush=True)
+
+
+def build_pdf_url(hash_id):
+    prefix = hash_id[:2]
+    return f"{CDN_BASE}/{prefix}/{hash_id}/{hash_id}.pdf"
+
+
+def download_pdf(hash_id):
+    req = urllib.request.Request(build_pdf_url(hash_id), headers={
+        "User-Agent": "EmailExplorer/1.0"
+    })
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        return resp.read()
 
 
 def query_documents(email1, email2, aliases1=None, aliases2=None):
@@ -91,15 +113,24 @@ def query_documents(email1, email2, aliases1=None, aliases2=None):
     log(f"MongoDB regex1: {regex1}")
     log(f"MongoDB regex2: {regex2}")
 
-    client = MongoClient(MONGO_URI)
-    db = client[MONGO_DB]
-
-    query = {
-        '$and': [
-            {'text': {'$regex': regex1, '$options': 'i'}},
-            {'text': {'$regex': regex2, '$options': 'i'}}
-        ]
-    }
+    db = get_db()
+
+    if has_emails_index(db.documents):
+        # Indexed lookup on canonical header addresses (extract_emails.py --index-emails)
+        query = {
+            '$and': [
+                {EMAILS_FIELD: {'$in': email_query_keys(aliases1 or [email1])}},
+                {EMAILS_FIELD: {'$in': email_query_keys(aliases2 or [email2])}}
+            ]
+        }
+        log("MongoDB: using emails index")
+    else:
+        query = {
+            '$and': [
+                {'text': {'$regex': regex1, '$options': 'i'}},
+                {'text': {'$regex': regex2, '$options': 'i'}}
+            ]
+        }
 
     cursor = db.documents.find(query, {'hash_id': 1}).limit(MAX_DOCS)
     hash_ids = []
@@ -108,28 +139,31 @@ def query_documents(email1, email2, aliases1=None, aliases2=None):
         if hid:
             hash_ids.append(str(hid))
 
-    client.close()
     return hash_ids
 
 
-def main():
-    if len(sys.argv) != 2:
-        print(json.dumps({"success": False, "error": "Usage: fetch_correspondence.py <json-file>"}))
-        sys.exit(1)
+def document_manifest(hash_ids):
+    """CDN URL and year for each hash_id, in hash_ids order."""
+    years = {}
+    for doc in get_db().documents.find({'hash_id': {'$in': hash_ids}}, {'hash_id': 1, 'year': 1}):
+        years[str(doc.get('hash_id'))] = doc.get('year')
+    return [{"hash_id": hid, "url": build_pdf_url(hid), "year": years.get(hid)} for hid in hash_ids]
 
-    with open(sys.argv[1]) as f:
-        params = json.load(f)
 
+def fetch_correspondence(params):
+    """Handle one request; returns the JSON-serializable response."""
     email1 = params.get("email1", "")
     email2 = params.get("email2", "")
     name1 = params.get("name1", "person1")
     name2 = params.get("name2", "person2")
     aliases1 = params.get("aliases1")
     aliases2 = params.get("aliases2")
+    mode = params.get("mode") or "zip"
 
     if not email1 or not email2:
-        print(json.dumps({"success": False, "error": "email1 and email2 are required"}))
-        return
+        return {"success": False, "error": "email1 and email2 are required"}
+    if mode not in ("zip", "manifest"):
+        return {"success": False, "error": f"unknown mode: {mode}"}
 
     log(f"Finding correspondence: {email1} <-> {email2}")
     if aliases1:
@@ -141,14 +175,17 @@ def main():
     hash_ids = query_documents(email1, email2, aliases1, aliases2)
     log(f"Found {len(hash_ids)} documents in MongoDB")
 
+    if mode == "manifest":
+        return {"success": True, "doc_count": len(hash_ids),
+                "documents": document_manifest(hash_ids), "next_cursor": None}
+
     if not hash_ids:
-        print(json.dumps({"success": True, "doc_count": 0, "download_url": None}))
-        return
+        return {"success": True, "doc_count": 0, "download_url": None}
 
     # Check S3 for existing zip (keyed by sorted email pair)
     s3_key = f"{S3_PREFIX}/{'___'.join(sorted([email1, email2]))}.zip"
+    s3 = get_s3()
     try:
-        s3 = boto3.client('s3')
         s3.head_object(Bucket=S3_BUCKET, Key=s3_key)
         url = s3.generate_presigned_url(
             'get_object',
@@ -156,49 +193,45 @@ def main():
             ExpiresIn=PRESIGN_EXPIRY
         )
         log("Found existing zip on S3")
-        print(json.dumps({
+        return {
             "success": True,
             "doc_count": len(hash_ids),
             "download_url": url,
             "cached": True
-        }))
-        return
+        }
     except ClientError:
         pass
 
-    # Download PDFs and create zip
+    # Download PDFs (cached PDFs skip the CDN) and create zip
+    cache = get_pdf_cache()
+    hits, misses, bytes_saved = cache.hits, cache.misses, cache.bytes_saved
     with tempfile.TemporaryDirectory() as tmpdir:
         zip_path = os.path.join(tmpdir, "correspondence.zip")
         pdf_count = 0
 
         with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
             for i, hash_id in enumerate(hash_ids):
-                pdf_url = build_pdf_url(hash_id)
                 log(f"[{i+1}/{len(hash_ids)}] {hash_id}")
+                misses_before = cache.misses
                 try:
-                    req = urllib.request.Request(pdf_url, headers={
-                        "User-Agent": "EmailExplorer/1.0"
-                    })
-                    with urllib.request.urlopen(req, timeout=30) as resp:
-                        pdf_data = resp.read()
+                    pdf_data = cache.fetch(hash_id, download_pdf)
                     zf.writestr(f"{hash_id}.pdf", pdf_data)
                     pdf_count += 1
                 except (urllib.error.URLError, urllib.error.HTTPError, OSError) as e:
                     log(f"  Failed: {e}")
 
-                if i < len(hash_ids) - 1:
+                if cache.misses > misses_before and i < len(hash_ids) - 1:
                     time.sleep(DOWNLOAD_DELAY)
 
-        log(f"Zipped {pdf_count} PDFs")
+        log(f"Zipped {pdf_count} PDFs (cache: {cache.hits - hits} hits, {cache.misses - misses} misses, "
+            f"{(cache.bytes_saved - bytes_saved) / 1e6:.1f} MB saved)")
 
         if pdf_count == 0:
-            print(json.dumps({"success": True, "doc_count": 0, "download_url": None}))
-            return
+            return {"success": True, "doc_count": 0, "download_url": None}
 
         # Upload to S3
         log(f"Uploading to s3://{S3_BUCKET}/{s3_key}")
         try:
-            s3 = boto3.client('s3')
             s3.upload_file(zip_path, S3_BUCKET, s3_key)
             url = s3.generate_presigned_url(
                 'get_object',
@@ -206,14 +239,48 @@ def main():
                 ExpiresIn=PRESIGN_EXPIRY
             )
             log("Upload complete")
-            print(json.dumps({
+            return {
                 "success": True,
                 "doc_count": pdf_count,
                 "download_url": url
-            }))
+            }
         except ClientError as e:
             log(f"S3 error: {e}")
-            print(json.dumps({"success": False, "error": str(e)}))
+            return {"success": False, "error": str(e)}
+
+
+def run_worker():
+    """Serve newline-delimited JSON requests from stdin until EOF."""
+    log("Worker ready")
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        request_id = None
+        try:
+            params = json.loads(line)
+            request_id = params.get("id")
+            result = fetch_correspondence(params)
+        except Exception as e:
+            log(f"Request failed: {e}")
+            result = {"success": False, "error": str(e)}
+        result["id"] = request_id
+        print(json.dumps(result), flush=True)
+
+
+def main():
+    if len(sys.argv) == 2 and sys.argv[1] == "--worker":
+        run_worker()
+        return
+
+    if len(sys.argv) != 2:
+        print(json.dumps({"success": False, "error": "Usage: fetch_correspondence.py <json-file> | --worker"}))
+        sys.exit(1)
+
+    with open(sys.argv[1]) as f:
+        params = json.load(f)
+
+    print(json.dumps(fetch_correspondence(params)))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Materialized pair -> documents index built from the network's edge doc_ids.
+
+Each unordered pair of canonical node IDs that share an edge (in either
+direction) becomes one MongoDB document:
+
+    {"_id": "a@x.gov___b@y.com", "a": ..., "b": ..., "weight": ...,
+     "years": [...], "doc_ids": [...sorted hash_ids...]}
+
+The key uses the same sorted "a___b" form as the S3 zip keys. Publishing
+writes into a scratch collection and renames it over the live one, so
+readers never see a half-built index.
+
+Usage:
+    python pair_index.py                          # Index public/email_network.json
+    python pair_index.py net.json --db test --collection correspondence_pairs
+"""
+
+import argparse
+import os
+
+from pymongo import MongoClient
+
+from dedup_network import DEFAULT_INPUT, iter_network_items, merge_sorted_unique
+
+PAIR_COLLECTION = os.environ.get("PAIR_COLLECTION", "correspondence_pairs")
+PUBLISH_BATCH = 1000
+
+
+def pair_key(email1, email2):
+    """Unordered key for a pair of canonical addresses."""
+    return '___'.join(sorted([email1, email2]))
+
+
+def build_pair_docs(network_path):
+    """Fold the network's directed edges into one record per unordered pair."""
+    pairs = {}
+    for edge in iter_network_items(network_path, "edges"):
+        a, b = sorted([edge["source"], edge["target"]])
+        key = f"{a}___{b}"
+        rec = pairs.get(key)
+        if rec is None:
+            pairs[key] = {
+                "_id": key,
+                "a": a,
+                "b": b,
+                "weight": edge.get("weight", 1),
+                "years": list(edge.get("years", [])),
+                "doc_ids": list(edge.get("doc_ids", [])),
+            }
+        else:
+            rec["weight"] += edge.get("weight", 1)
+            rec["years"] = merge_sorted_unique(rec["years"], edge.get("years", []))
+            rec["doc_ids"] = merge_sorted_unique(rec["doc_ids"], edge.get("doc_ids", []))
+    return pairs
+
+
+def publish_pair_index(db, network_path=DEFAULT_INPUT, collection=PAIR_COLLECTION):
+    """Rebuild db[collection] from the network file. Returns the pair count."""
+    print(f"Building pair index from {network_path}...")
+    pairs = build_pair_docs(network_path)
+
+    scratch = db[f"{collection}_building"]
+    scratch.drop()
+    batch = []
+    for rec in pairs.values():
+        batch.append(rec)
+        if len(batch) >= PUBLISH_BATCH:
+            scratch.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        scratch.insert_many(batch, ordered=False)
+
+    if pairs:
+        scratch.rename(collection, dropTarget=True)
+    else:
+        db[collection].drop()
+    print(f"  Published {len(pairs)} pairs to {db.name}.{collection}")
+    return len(pairs)
+
+
+def lookup_pair(coll, email1, email2, limit=None):
+    """Sorted hash_ids linking two canonical addresses, or None if unindexed."""
+    projection = {"doc_ids": {"$slice": limit} if limit else 1}
+    doc = coll.find_one({"_id": pair_key(email1, email2)}, projection)
+    if doc is None:
+        return None
+    return doc.get("doc_ids", [])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Publish the pair -> documents index for a network file'
+    )
+    parser.add_argument('input', nargs='?', default=DEFAULT_INPUT,
+                        help=f'Network JSON file (default: {DEFAULT_INPUT})')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017', help='MongoDB URI')
+    parser.add_argument('--db', default='test', help='Database name')
+    parser.add_argument('--collection', default=PAIR_COLLECTION,
+                        help=f'Collection name (default: {PAIR_COLLECTION})')
+
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri)
+    publish_pair_index(client[args.db], args.input, args.collection)
+
+
+if __name__ == '__main__':
+    main()
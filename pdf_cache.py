@@ -0,0 +1,170 @@
+"""Local content-addressed PDF cache shared by app.py and fetch_correspondence.py.
+
+PDFs are stored as <cache_dir>/<hash_id[:2]>/<hash_id>.pdf, mirroring the CDN
+layout. Reads bump the file's mtime, so evicting the oldest mtimes first is
+LRU. Once the cache grows past max_bytes it is trimmed to 90% of the limit.
+Several processes can share one directory: writes are atomic renames, and
+each process re-scans the directory every RESCAN_INTERVAL seconds or
+RESCAN_PUTS writes, so the size it checks against the limit includes what
+the others wrote. The limit can overshoot by at most what other processes
+wrote since the last scan.
+"""
+
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+PDF_CACHE_DIR = os.environ.get(
+    "PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "emailexplorer-pdfs"))
+PDF_CACHE_MAX_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+EVICT_TO = 0.9
+RESCAN_INTERVAL = 10.0
+RESCAN_PUTS = 100
+
+_HASH_ID_RE = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class PdfCache:
+    """On-disk LRU cache of PDF bytes keyed by hash_id, with hit/miss counters."""
+
+    def __init__(self, cache_dir=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES, log=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.log = log or (lambda msg: print(msg, file=sys.stderr, flush=True))
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._rescan()
+
+    def path(self, hash_id):
+        return os.path.join(self.cache_dir, hash_id[:2], f"{hash_id}.pdf")
+
+    def _entries(self):
+        """(mtime, path, size) for every cached PDF."""
+        entries = []
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".pdf"):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue  # evicted by another process
+                    entries.append((st.st_mtime, entry.path, st.st_size))
+        return entries
+
+    def _rescan(self):
+        """Reset the size estimate to what is on disk, across all processes."""
+        size = sum(size for _, _, size in self._entries())
+        with self._lock:
+            self._size = size
+            self._scanned_at = time.monotonic()
+            self._puts_since_scan = 0
+
+    def get(self, hash_id, count=True):
+        """Cached PDF bytes, or None on a miss.
+
+        With count=False the lookup is left out of the hit/miss counters,
+        for re-reading a PDF this process has just fetched.
+        """
+        if not _HASH_ID_RE.fullmatch(hash_id):
+            return None
+        path = self.path(hash_id)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            if not isinstance(e, FileNotFoundError):
+                self.log(f"PDF cache: could not read {hash_id}: {e}")
+            if count:
+                with self._lock:
+                    self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # read-only cache: LRU order degrades to write order
+        if count:
+            with self._lock:
+                self.hits += 1
+                self.bytes_saved += len(data)
+        return data
+
+    def put(self, hash_id, data):
+        if not _HASH_ID_RE.fullmatch(hash_id):
+            return
+        path = self.path(hash_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._size += len(data)
+            self._puts_since_scan += 1
+            stale = (self._puts_since_scan >= RESCAN_PUTS
+                     or time.monotonic() - self._scanned_at >= RESCAN_INTERVAL)
+        if stale:
+            self._rescan()
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def fetch(self, hash_id, download):
+        """Return the PDF from the cache, calling download(hash_id) on a miss.
+
+        Caching is best-effort: if the download cannot be stored (disk full,
+        read-only directory), it is logged and the bytes are still returned.
+        """
+        data = self.get(hash_id)
+        if data is None:
+            data = download(hash_id)
+            try:
+                self.put(hash_id, data)
+            except OSError as e:
+                self.log(f"PDF cache: could not store {hash_id}: {e}")
+        return data
+
+    def evict(self):
+        """Drop least recently used PDFs until the cache is under EVICT_TO of its limit."""
+        with self._lock:
+            entries = sorted(self._entries())
+            size = sum(e[2] for e in entries)
+            target = self.max_bytes * EVICT_TO
+            for _, path, file_size in entries:
+                if size <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                size -= file_size
+                self.evictions += 1
+            self._size = size
+            self._scanned_at = time.monotonic()
+            self._puts_since_scan = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "evictions": self.evictions,
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Extract and deduplicate the email network in one process.
+
+Runs extract_emails.build_email_network, shapes the graph the same way
+export_to_json does, and hands the in-memory nodes/edges straight to the
+dedup_network layers. Only the final deduplicated network is written, so the
+intermediate email_network.json is never serialized and re-parsed.
+
+Usage:
+    python pipeline.py                                # Write public/email_network.json
+    python pipeline.py --max-docs 5000 --output net.json
+    python pipeline.py --compare                      # Also time the two-script flow
+    python pipeline.py --publish-pairs                # Also publish the pair -> documents index
+
+Library use:
+    from pipeline import run_pipeline
+    run_pipeline(db, "public/email_network.json")
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from pymongo import MongoClient
+
+from extract_emails import build_email_network, build_network_output, export_to_json
+from dedup_network import DEFAULT_INPUT, build_alias_map, run_dedup, write_deduped
+from pair_index import PAIR_COLLECTION, publish_pair_index
+
+
+def dedup_in_memory(network, output_path, no_fuzzy=False, report=False,
+                    external_sort=False, spill_dir=None):
+    """Deduplicate a network dict (as built by build_network_output) and write it.
+
+    Returns the stats of the written network.
+    """
+    nodes_by_id = {n["id"]: n for n in network["nodes"]}
+    print(f"Original: {len(nodes_by_id)} nodes, {len(network['edges'])} edges")
+
+    final_remap, best_id_groups = build_alias_map(
+        nodes_by_id, no_fuzzy=no_fuzzy, report=report
+    )
+    return write_deduped(
+        nodes_by_id, final_remap, best_id_groups, network["edges"], output_path,
+        external_sort=external_sort, spill_dir=spill_dir,
+    )
+
+
+def run_two_script_flow(nodes, edges, display_names, output_path,
+                        min_count=1, min_weight=1, no_fuzzy=False):
+    """Time the legacy extract -> JSON -> dedup flow on already-extracted data.
+
+    Writes the intermediate file to a temp directory, exactly as running
+    extract_emails.py followed by dedup_network.py would. Returns seconds.
+    """
+    start = time.monotonic()
+    with tempfile.TemporaryDirectory(prefix="pipeline-compare-") as tmpdir:
+        intermediate = os.path.join(tmpdir, "email_network.json")
+        export_to_json(nodes, edges, display_names, intermediate, min_count, min_weight)
+        run_dedup(intermediate, output_path=output_path, no_fuzzy=no_fuzzy)
+    return time.monotonic() - start
+
+
+def run_pipeline(db, output_path=DEFAULT_INPUT, max_docs=None, min_count=1, min_weight=1,
+                 no_fuzzy=False, report=False, external_sort=False, spill_dir=None,
+                 compare=False, pair_db=None, pair_collection=PAIR_COLLECTION):
+    """Extract the network from MongoDB and write the deduplicated result.
+
+    With pair_db, the pair -> documents index is rebuilt from the written
+    network into pair_db[pair_collection]. With compare, the legacy
+    two-script flow is also run on the same extracted data (writing to a
+    scratch file) and the wall time saved by skipping the JSON round-trip
+    is reported.
+
+    Returns a dict of timings in seconds.
+    """
+    timings = {}
+
+    start = time.monotonic()
+    nodes, edges, display_names = build_email_network(db, max_docs)
+    timings["extract"] = time.monotonic() - start
+
+    start = time.monotonic()
+    print("\nBuilding network...")
+    network = build_network_output(nodes, edges, display_names, min_count, min_weight)
+    print("\nDeduplicating...")
+    dedup_in_memory(network, output_path, no_fuzzy=no_fuzzy, report=report,
+                    external_sort=external_sort, spill_dir=spill_dir)
+    del network
+    timings["fused"] = time.monotonic() - start
+
+    if pair_db is not None:
+        print("\nPublishing pair index...")
+        start = time.monotonic()
+        publish_pair_index(pair_db, output_path, pair_collection)
+        timings["publish_pairs"] = time.monotonic() - start
+
+    if compare:
+        print("\n=== Two-script flow (for comparison) ===")
+        scratch = output_path + ".compare"
+        try:
+            timings["two_script"] = run_two_script_flow(
+                nodes, edges, display_names, scratch,
+                min_count=min_count, min_weight=min_weight, no_fuzzy=no_fuzzy,
+            )
+        finally:
+            if os.path.exists(scratch):
+                os.remove(scratch)
+
+    print("\n=== Pipeline Timings ===")
+    print(f"  Extraction: {timings['extract']:.1f}s")
+    print(f"  Build + dedup (in-process): {timings['fused']:.1f}s")
+    if "publish_pairs" in timings:
+        print(f"  Publish pair index: {timings['publish_pairs']:.1f}s")
+    if "two_script" in timings:
+        saved = timings["two_script"] - timings["fused"]
+        print(f"  Build + dedup (two-script flow): {timings['two_script']:.1f}s")
+        print(f"  Wall time saved: {saved:.1f}s "
+              f"({saved / max(timings['two_script'], 1e-9) * 100:.0f}%)")
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Extract the email network from MongoDB and deduplicate it in one pass'
+    )
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017', help='MongoDB URI')
+    parser.add_argument('--db', default='toxic_docs', help='Database name')
+    parser.add_argument('--output', '-o', default=DEFAULT_INPUT,
+                        help=f'Output JSON file (default: {DEFAULT_INPUT})')
+    parser.add_argument('--max-docs', type=int, help='Maximum documents to process')
+    parser.add_argument('--min-count', type=int, default=1, help='Minimum email activity to include node')
+    parser.add_argument('--min-weight', type=int, default=1, help='Minimum edge weight to include')
+    parser.add_argument('--no-fuzzy', action='store_true', help='Skip dedup Layer 4 (fuzzy edit-distance)')
+    parser.add_argument('--report', action='store_true', help='Print dedup merge groups')
+    parser.add_argument('--external-sort', action='store_true',
+                        help='Merge edges through sorted run files on disk')
+    parser.add_argument('--spill-dir', default=None, help='Directory for external sort run files')
+    parser.add_argument('--compare', action='store_true',
+                        help='Also run the extract -> JSON -> dedup flow and report time saved')
+    parser.add_argument('--publish-pairs', action='store_true',
+                        help='Publish the pair -> documents index used by the app')
+    parser.add_argument('--pair-db', default='test',
+                        help='Database the app reads the pair index from (default: test)')
+    parser.add_argument('--pair-collection', default=PAIR_COLLECTION,
+                        help=f'Pair index collection (default: {PAIR_COLLECTION})')
+
+    args = parser.parse_args()
+
+    print(f"Connecting to MongoDB at {args.mongo_uri}...")
+    client = MongoClient(args.mongo_uri)
+    db = client[args.db]
+
+    run_pipeline(
+        db, args.output,
+        max_docs=args.max_docs,
+        min_count=args.min_count,
+        min_weight=args.min_weight,
+        no_fuzzy=args.no_fuzzy,
+        report=args.report,
+        external_sort=args.external_sort,
+        spill_dir=args.spill_dir,
+        compare=args.compare,
+        pair_db=client[args.pair_db] if args.publish_pairs else None,
+        pair_collection=args.pair_collection,
+    )
+
+    print("\nDone!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Prewarm correspondence zips for the heaviest edges in the network.
+
+Ranks unordered pairs by total edge weight and runs the same build the
+/api/fetch-correspondence endpoint does for the top N, so the first click
+on a popular pair is a cache hit. Pairs whose zip manifest already covers
+their documents cost one S3 lookup and no downloads. Meant to be run from
+cron off-peak.
+
+CDN requests are rate limited as in app.py. With BUILD_LOCK_DIR set (to the
+same directory as the web app), the limit is shared across processes, so
+prewarming eats into the app's budget rather than adding to it. Without it
+this process has a limit of its own, so it defaults to half of
+CDN_RATE_LIMIT; --delay sets a gentler pace either way.
+
+Usage:
+    python prewarm.py                          # Top 100 pairs
+    python prewarm.py --top 500 --budget 120   # Stop starting new pairs after 2 hours
+    python prewarm.py --delay 2                # At most one CDN request every 2 seconds
+    python prewarm.py --dry-run                # Just list the pairs
+"""
+
+import argparse
+import heapq
+import time
+from collections import defaultdict
+
+import app
+from dedup_network import iter_network_items
+
+
+def rank_pairs(network_path, top):
+    """The top (weight, a, b) unordered pairs by summed edge weight."""
+    weights = defaultdict(int)
+    for edge in iter_network_items(network_path, "edges"):
+        a, b = sorted([edge["source"], edge["target"]])
+        weights[(a, b)] += edge.get("weight", 1)
+    return heapq.nlargest(top, ((w, a, b) for (a, b), w in weights.items()))
+
+
+def _outcome(result):
+    if not result["success"]:
+        return "failed"
+    if result["download_url"] is None:
+        return "empty"
+    if result.get("added"):
+        return "refreshed"
+    if result.get("cached"):
+        return "current"
+    return "built"
+
+
+def prewarm(network_path=app.NETWORK_PATH, top=100, budget=None, dry_run=False):
+    """Build or refresh zips for the top pairs. Returns outcome counts.
+
+    budget is in seconds; no new pair is started once it is spent.
+    """
+    pairs = rank_pairs(network_path, top)
+    print(f"Prewarming {len(pairs)} pairs from {network_path}")
+    deadline = time.monotonic() + budget if budget else None
+    counts = defaultdict(int)
+
+    for i, (weight, a, b) in enumerate(pairs, 1):
+        if deadline is not None and time.monotonic() > deadline:
+            print(f"  Time budget spent, stopping after {i - 1} pairs")
+            break
+        if dry_run:
+            print(f"  [{i}/{len(pairs)}] {a} <-> {b} (weight {weight})")
+            continue
+
+        start = time.monotonic()
+        job = app.Job(a, b)
+        try:
+            result = app.build_correspondence(job, a, b, None, None)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        outcome = _outcome(result)
+        counts[outcome] += 1
+        print(f"  [{i}/{len(pairs)}] {a} <-> {b} (weight {weight}): {outcome}, "
+              f"{result.get('doc_count', 0)} docs, {job.downloaded} fetched, "
+              f"{time.monotonic() - start:.1f}s")
+
+    if not dry_run:
+        print("\n=== Prewarm Summary ===")
+        for outcome in ("built", "refreshed", "current", "empty", "failed"):
+            print(f"  {outcome}: {counts[outcome]}")
+        stats = app.PDF_CACHE.stats()
+        print(f"  PDF cache: {stats['hits']} hits, {stats['misses']} misses")
+    return dict(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build correspondence zips for the heaviest network edges'
+    )
+    parser.add_argument('--network', default=app.NETWORK_PATH,
+                        help=f'Network JSON file (default: {app.NETWORK_PATH})')
+    parser.add_argument('--top', type=int, default=100, help='Number of pairs to prewarm')
+    parser.add_argument('--budget', type=float, default=None,
+                        help='Minutes after which no new pair is started')
+    parser.add_argument('--delay', type=float, default=None,
+                        help='Minimum seconds between this process\'s CDN requests')
+    parser.add_argument('--dry-run', action='store_true', help='List the pairs without building')
+
+    args = parser.parse_args()
+
+    if args.delay:
+        app.CDN_RATE = app.RateLimits(app.CDN_RATE, app.TokenBucket(1 / args.delay))
+    elif isinstance(app.CDN_RATE, app.TokenBucket):
+        # Not coordinated with the web app: leave it most of the CDN budget
+        app.CDN_RATE = app.TokenBucket(app.CDN_RATE_LIMIT / 2)
+
+    prewarm(args.network, args.top,
+            budget=args.budget * 60 if args.budget else None,
+            dry_run=args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
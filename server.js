@@ -1,48 +1,135 @@
 const express = require('express');
 const path = require('path');
+const readline = require('readline');
 const { spawn } = require('child_process');
 
 const app = express();
 app.use(express.json());
 app.use(express.static('public'));
 
-app.post('/api/fetch-correspondence', (req, res) => {
-  const { email1, email2, name1, name2 } = req.body;
-  if (!email1 || !email2) {
-    return res.status(400).json({ success: false, error: 'email1 and email2 are required' });
-  }
+// Pool of long-running `fetch_correspondence.py --worker` processes. Each takes
+// one newline-delimited JSON request at a time and keeps its Mongo/S3 clients
+// warm, so requests skip interpreter startup and connection setup.
+const POOL_SIZE = parseInt(process.env.FETCH_WORKERS || '2', 10);
+// A request still queued or running after this long is answered with an error
+const FETCH_TIMEOUT_MS = parseInt(process.env.FETCH_TIMEOUT_MS || '900000', 10);
+const pythonPath = path.join(__dirname, '.venv', 'bin', 'python');
+const scriptPath = path.join(__dirname, 'fetch_correspondence.py');
 
-  // Write params to temp file for the Python script
-  const fs = require('fs');
-  const os = require('os');
-  const tmpFile = path.join(os.tmpdir(), `zip-${Date.now()}.json`);
-  fs.writeFileSync(tmpFile, JSON.stringify({ email1, email2, name1: name1 || 'person1', name2: name2 || 'person2' }));
+const workers = [];
+const queue = [];
+let nextRequestId = 1;
 
-  const pythonPath = path.join(__dirname, '.venv', 'bin', 'python');
-  const scriptPath = path.join(__dirname, 'fetch_correspondence.py');
-  const child = spawn(pythonPath, [scriptPath, tmpFile]);
+// Failures of the pool itself (spawn errors, crashes, timeouts) are 500s
+function settle(job, result, status = 200) {
+  if (job.settled) return;
+  job.settled = true;
+  clearTimeout(job.timer);
+  job.resolve({ result, status });
+}
 
-  let stdout = '';
-  let stderr = '';
+function startWorker() {
+  const child = spawn(pythonPath, [scriptPath, '--worker']);
+  const worker = { child, current: null, retired: false, closed: false };
 
-  child.stdout.on('data', (data) => { stdout += data.toString(); });
-  child.stderr.on('data', (data) => { stderr += data.toString(); });
+  // Kill a worker whose output can no longer be trusted; 'close' replaces it
+  function recycle(reason) {
+    console.error(`Recycling fetch worker ${child.pid}: ${reason}`);
+    worker.retired = true;
+    child.kill();
+  }
+  worker.recycle = recycle;
 
-  child.on('close', (code) => {
-    fs.unlink(tmpFile, () => {});
-    if (stderr) console.error('[fetch_correspondence]', stderr);
+  readline.createInterface({ input: child.stdout }).on('line', (line) => {
+    const job = worker.current;
+    let result;
     try {
-      const result = JSON.parse(stdout);
-      res.json(result);
+      result = JSON.parse(line);
     } catch (e) {
-      res.status(500).json({ success: false, error: 'Failed to parse script output', details: stdout });
+      console.error('[fetch_correspondence] unexpected output:', line);
+      return;
+    }
+    if (!job || !result || result.id !== job.params.id) {
+      // A response for some other request: this worker is out of step
+      recycle(`response for request ${result && result.id}, expected ${job && job.params.id}`);
+      return;
+    }
+    worker.current = null;
+    delete result.id;
+    settle(job, result);
+    dispatch();
+  });
+
+  child.stderr.on('data', (data) => { console.error('[fetch_correspondence]', data.toString().trimEnd()); });
+
+  // A failed spawn emits 'error' and 'close' but never 'exit'
+  child.on('error', (err) => { console.error('Fetch worker error: ' + err.message); });
+  // A write racing a worker crash is reported through 'close' below
+  child.stdin.on('error', () => {});
+
+  child.on('close', (code, signal) => {
+    if (worker.closed) return;
+    worker.closed = worker.retired = true;
+    const i = workers.indexOf(worker);
+    if (i >= 0) workers.splice(i, 1);
+    if (worker.current) {
+      settle(worker.current, {
+        success: false, error: `Worker exited with ${code !== null ? 'code ' + code : signal || 'spawn failure'}`
+      }, 500);
+      worker.current = null;
     }
+    // Replace the worker after a short pause so a crash loop doesn't spin
+    setTimeout(() => { workers.push(startWorker()); dispatch(); }, 1000);
   });
 
-  child.on('error', (err) => {
-    fs.unlink(tmpFile, () => {});
-    res.status(500).json({ success: false, error: 'Failed to spawn Python script: ' + err.message });
+  return worker;
+}
+
+function dispatch() {
+  for (const worker of workers) {
+    if (!queue.length) return;
+    if (!worker.current && !worker.retired) {
+      const job = queue.shift();
+      worker.current = job;
+      job.worker = worker;
+      worker.child.stdin.write(JSON.stringify(job.params) + '\n');
+    }
+  }
+}
+
+function runFetch(params) {
+  return new Promise((resolve) => {
+    const job = { params: { ...params, id: nextRequestId++ }, resolve, settled: false, worker: null };
+    job.timer = setTimeout(() => {
+      const i = queue.indexOf(job);
+      if (i >= 0) queue.splice(i, 1);
+      // The worker is still busy with this request; replace it rather than wait
+      if (job.worker && job.worker.current === job) {
+        job.worker.current = null;
+        job.worker.recycle(`request ${job.params.id} timed out`);
+      }
+      settle(job, { success: false, error: `Timed out after ${FETCH_TIMEOUT_MS / 1000}s` }, 500);
+    }, FETCH_TIMEOUT_MS);
+    queue.push(job);
+    dispatch();
   });
+}
+
+for (let i = 0; i < POOL_SIZE; i++) {
+  workers.push(startWorker());
+}
+
+app.post('/api/fetch-correspondence', (req, res) => {
+  const { email1, email2, name1, name2, aliases1, aliases2, mode } = req.body;
+  if (!email1 || !email2) {
+    return res.status(400).json({ success: false, error: 'email1 and email2 are required' });
+  }
+
+  runFetch({
+    email1, email2,
+    name1: name1 || 'person1', name2: name2 || 'person2',
+    aliases1, aliases2, mode
+  }).then(({ result, status }) => res.status(status).json(result));
 });
 
 const PORT = process.env.PORT || 3000;